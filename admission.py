@@ -0,0 +1,109 @@
+import math
+import time
+import threading
+
+import metrics
+
+
+class OverloadedError(Exception):
+    def __init__(self, lane, retry_after):
+        super().__init__(f"Too many {lane} requests in progress, retry in {retry_after}s")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class Ticket:
+    def __init__(self, lane):
+        self.lane = lane
+        self.started_at = time.monotonic()
+        self._released = False
+
+    def release(self):
+        # Idempotent: streaming responses release from call_on_close, which can run
+        # after an error path has already released
+        if self._released:
+            return
+        self._released = True
+        self.lane._leave(time.monotonic() - self.started_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Lane:
+    """Bounded in-flight limit with a short wait queue in front of it.
+
+    A request that finds every slot busy waits up to max_wait seconds, but only if fewer
+    than max_queue requests are already waiting; otherwise it is rejected at once with
+    OverloadedError, whose retry_after comes from the recent average time a slot is held.
+    """
+
+    def __init__(self, name, max_in_flight, max_queue=0, max_wait=0.0):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._avg_hold = None
+        self._cond = threading.Condition()
+
+    def enter(self):
+        inicio = time.monotonic()
+        with self._cond:
+            if self.in_flight >= self.max_in_flight:
+                if self.queued >= self.max_queue or self.max_wait <= 0:
+                    self._reject()
+                self.queued += 1
+                self._publish()
+                try:
+                    admitted = self._cond.wait_for(lambda: self.in_flight < self.max_in_flight, timeout=self.max_wait)
+                finally:
+                    self.queued -= 1
+                if not admitted:
+                    self._reject()
+            self.in_flight += 1
+            self.admitted += 1
+            self._publish()
+        metrics.ADMISSION_WAIT.observe(time.monotonic() - inicio, (self.name,))
+        return Ticket(self)
+
+    def retry_after(self):
+        # Seconds until the requests ahead are likely done, rounded up and at least 1
+        hold = self._avg_hold or 1.0
+        return max(1, math.ceil(hold * (self.in_flight + self.queued) / self.max_in_flight))
+
+    def stats(self):
+        with self._cond:
+            return {
+                'in_flight': self.in_flight,
+                'queued': self.queued,
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'avg_hold_seconds': self._avg_hold,
+            }
+
+    def _reject(self):
+        # Called with the condition held
+        self.rejected += 1
+        metrics.ADMISSION_REJECTED.inc((self.name,))
+        self._publish()
+        raise OverloadedError(self.name, self.retry_after())
+
+    def _leave(self, held):
+        with self._cond:
+            self.in_flight -= 1
+            self._avg_hold = held if self._avg_hold is None else 0.8 * self._avg_hold + 0.2 * held
+            self._publish()
+            self._cond.notify()
+
+    def _publish(self):
+        metrics.ADMISSION_IN_FLIGHT.set(self.in_flight, (self.name,))
+        metrics.ADMISSION_QUEUED.set(self.queued, (self.name,))
@@ -0,0 +1,142 @@
+import os
+import math
+
+from sqlalchemy import func, select
+
+import metrics
+from cache import ResultCache
+from models import db, LabResult
+from biomarkers import NOMBRES
+
+# Bump whenever the shape of the analytics payload changes
+ANALYTICS_VERSION = "2"
+DEFAULT_WINDOW = 3
+
+analytics_cache = ResultCache(max_items=int(os.environ.get('ANALYTICS_CACHE_SIZE', 1024)))
+
+_SEGUNDOS_POR_DIA = 86400.0
+
+
+def _clave(user_id, window):
+    return f"{ANALYTICS_VERSION}-{user_id}-{window}"
+
+
+def invalidar(user_id):
+    analytics_cache.delete_prefix(f"{ANALYTICS_VERSION}-{user_id}-")
+
+
+def _sello(user_id):
+    # Number and newest id of the user's rows: an index-only lookup that changes whenever
+    # any worker stores a report, so cached aggregates never outlive the data they came from
+    query = select(func.count(LabResult.id), func.max(LabResult.id)).where(LabResult.user_id == user_id)
+    return tuple(db.session.execute(query).one())
+
+
+def _cargar(user_id):
+    import pandas as pd
+
+    query = (
+        select(LabResult.id, LabResult.test, LabResult.date, LabResult.value, LabResult.unit,
+               LabResult.ref_low, LabResult.ref_high, LabResult.status)
+        .where(LabResult.user_id == user_id)
+    )
+    filas = db.session.execute(query).all()
+    df = pd.DataFrame(filas, columns=['id', 'test', 'date', 'value', 'unit', 'refLow', 'refHigh', 'status'])
+    df['value'] = pd.to_numeric(df['value'], errors='coerce')
+    df['date'] = pd.to_datetime(df['date'])
+    return df.sort_values(['test', 'date', 'id'], kind='stable', ignore_index=True)
+
+
+def calcular_series(df, window=DEFAULT_WINDOW):
+    """Adds per-test deltas, rolling means and status transitions to the user's lab results.
+
+    df must be sorted by test and date; every column is computed with grouped shifts and
+    rolling windows over the whole frame, never one test at a time.
+    """
+    import numpy as np
+
+    grupos = df.groupby('test', sort=False)
+    previo = grupos['value'].shift()
+    df['delta'] = df['value'] - previo
+    df['deltaPct'] = np.where(previo.abs() > 0, df['delta'] / previo.abs() * 100, np.nan)
+    df['rollingMean'] = (
+        grupos['value'].rolling(window, min_periods=1).mean().reset_index(level=0, drop=True)
+    )
+    estado_previo = grupos['status'].shift()
+    df['previousStatus'] = estado_previo
+    df['statusChanged'] = estado_previo.notna() & (df['status'] != estado_previo)
+    return df
+
+
+def calcular_pendientes(df):
+    # Least-squares slope per test in units per day, from grouped sums instead of one fit per test
+    import pandas as pd
+
+    validos = df[df['value'].notna()]
+    # Days since the first result keeps the sums small enough to stay numerically stable.
+    # total_seconds() is independent of the datetime resolution (pandas may store ns or us)
+    x = (validos['date'] - validos['date'].min()).dt.total_seconds() / _SEGUNDOS_POR_DIA
+    y = validos['value']
+    sumas = pd.DataFrame({
+        'test': validos['test'], 'n': 1.0, 'x': x, 'y': y, 'xx': x * x, 'xy': x * y
+    }).groupby('test', sort=False).sum()
+    denominador = sumas['n'] * sumas['xx'] - sumas['x'] ** 2
+    pendiente = (sumas['n'] * sumas['xy'] - sumas['x'] * sumas['y']) / denominador.where(denominador > 0)
+    return pendiente
+
+
+def _json(valor):
+    if hasattr(valor, 'item'):
+        # NumPy scalar
+        valor = valor.item()
+    if valor is None or (isinstance(valor, float) and not math.isfinite(valor)):
+        return None
+    return valor
+
+
+def _construir(df, window):
+    if df.empty:
+        return {'window': window, 'reports': 0, 'tests': []}
+
+    df = calcular_series(df, window)
+    pendientes = calcular_pendientes(df)
+    df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+
+    columnas = ['date', 'value', 'unit', 'refLow', 'refHigh', 'status', 'delta', 'deltaPct',
+                'rollingMean', 'previousStatus', 'statusChanged']
+    tests = {}
+    for test, *valores in df[['test'] + columnas].itertuples(index=False, name=None):
+        tests.setdefault(test, []).append({nombre: _json(valor) for nombre, valor in zip(columnas, valores)})
+
+    salida = []
+    for test, puntos in tests.items():
+        transiciones = [
+            {'date': punto['date'], 'from': punto['previousStatus'], 'to': punto['status']}
+            for punto in puntos if punto['statusChanged']
+        ]
+        for punto in puntos:
+            del punto['previousStatus'], punto['statusChanged']
+        salida.append({
+            'test': test,
+            'name': NOMBRES.get(test, test),
+            'unit': puntos[-1]['unit'],
+            'latest': puntos[-1],
+            'slopePerDay': _json(pendientes.get(test)),
+            'transitions': transiciones,
+            'points': puntos,
+        })
+
+    return {'window': window, 'reports': int(df['date'].nunique()), 'tests': salida}
+
+
+def analitica_usuario(user_id, window=DEFAULT_WINDOW):
+    clave = _clave(user_id, window)
+    sello = _sello(user_id)
+    cached = analytics_cache.get(clave)
+    if cached is not None and cached[0] == sello:
+        return cached[1]
+
+    with metrics.stage('analytics'):
+        resultado = _construir(_cargar(user_id), window)
+    analytics_cache.set(clave, (sello, resultado))
+    return resultado
@@ -1,108 +1,594 @@
+import io
 import os
 import json
+import shutil
+import hashlib
 import tempfile
-import pandas as pd
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
+from flask_migrate import Migrate
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 from datetime import datetime, timezone
+import time
 import traceback
+from concurrent.futures import as_completed
 
-from pdf_processor import extraer_texto_de_pdf
-from data_extractor import parsear_lineas_a_dataframe, clasificar_resultados
-from report_generator import generar_reporte_ia, create_medical_report_pdf
+import metrics
+from pipeline import (
+    enviar_analisis, iterar_analisis_paralelo, rangos_streaming, obtener_pool,
+    CACHE_VERSION, MAX_WORKERS
+)
+from cache import ResultCache, content_key
+from resultados import a_registros, desde_registros, contar_estados
+from models import db
+from storage import guardar_reporte, huella_reporte, tendencia, reporte_anterior
+from analytics import analitica_usuario, analytics_cache, DEFAULT_WINDOW
+from jobs import JobQueue, QueueFullError
+from admission import Lane, OverloadedError
+from report_generator import (
+    generar_reporte_ia, generar_reporte_ia_stream, render_medical_report_pdf, report_cache, clave_reporte
+)
+from llm_client import LLM_MAX_CONCURRENCY
 
 load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'un-secreto-de-respaldo')
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///medilab.db')
 
-def calculate_summary_from_df(df):
-    status_counts = df['status'].value_counts()
+db.init_app(app)
+migrate = Migrate(app, db)
+
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+
+PDF_SPOOL_THRESHOLD = int(os.environ.get('PDF_SPOOL_THRESHOLD_MB', 20)) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# /api/analyze bodies up to this size are read before admission picks the fast or analyze lane
+FAST_LANE_MAX_UPLOAD = int(os.environ.get('FAST_LANE_MAX_UPLOAD_KB', 1024)) * 1024
+
+result_cache = ResultCache(
+    max_items=int(os.environ.get('RESULT_CACHE_SIZE', 256)),
+    disk_dir=os.environ.get('RESULT_CACHE_DIR'),
+    disk_max_bytes=int(os.environ.get('RESULT_CACHE_MAX_MB', 256)) * 1024 * 1024
+)
+
+# Per-process admission control: heavy parses and LLM reports each get a bounded number of
+# slots and a short wait queue; requests answered from the caches use their own lane so
+# they are never queued behind them. Saturated lanes answer 429 with Retry-After.
+admission_lanes = {
+    'analyze': Lane(
+        'analyze',
+        max_in_flight=int(os.environ.get('ANALYZE_MAX_IN_FLIGHT', max(2, MAX_WORKERS))),
+        max_queue=int(os.environ.get('ANALYZE_MAX_QUEUE', 2 * max(2, MAX_WORKERS))),
+        max_wait=float(os.environ.get('ANALYZE_MAX_WAIT', 2))
+    ),
+    'report': Lane(
+        'report',
+        max_in_flight=int(os.environ.get('REPORT_MAX_IN_FLIGHT', LLM_MAX_CONCURRENCY)),
+        max_queue=int(os.environ.get('REPORT_MAX_QUEUE', 2 * LLM_MAX_CONCURRENCY)),
+        max_wait=float(os.environ.get('REPORT_MAX_WAIT', 5))
+    ),
+    'fast': Lane(
+        'fast',
+        max_in_flight=int(os.environ.get('FAST_LANE_MAX_IN_FLIGHT', 32)),
+        max_queue=int(os.environ.get('FAST_LANE_MAX_QUEUE', 32)),
+        max_wait=float(os.environ.get('FAST_LANE_MAX_WAIT', 1))
+    ),
+}
+
+def _overloaded(error):
+    return jsonify({'error': str(error), 'lane': error.lane}), 429, {'Retry-After': str(error.retry_after)}
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.start_request()
+
+@app.after_request
+def _record_request_metrics(response):
+    endpoint = request.endpoint or 'unknown'
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, (endpoint,))
+    metrics.REQUESTS.inc((endpoint, str(response.status_code)))
+    collected = metrics.end_request()
+    if SERVER_TIMING and collected and collected['stages']:
+        response.headers['Server-Timing'] = metrics.server_timing(collected)
+    return response
+
+@app.teardown_request
+def _clear_request_metrics(exc):
+    metrics.end_request()
+
+def _cache_metrics():
+    stats = {'results': result_cache.stats(), 'reports': report_cache.stats(), 'analytics': analytics_cache.stats()}
+    return [
+        ('medilab_cache_hits_total', 'counter', 'Cache hits by cache',
+         [({'cache': name}, cache['hits']) for name, cache in stats.items()]),
+        ('medilab_cache_misses_total', 'counter', 'Cache misses by cache',
+         [({'cache': name}, cache['misses']) for name, cache in stats.items()]),
+    ]
+
+def _job_metrics():
+    # Read from the job directory every worker shares, so it is reported once, not per worker
+    return [
+        ('medilab_report_jobs', 'gauge', 'Report jobs by status',
+         [({'status': status}, value) for status, value in report_jobs.stats().items()]),
+    ]
+
+metrics.register_callback(_cache_metrics)
+metrics.register_callback(_job_metrics, shared=True)
+
+def _analysis_result(future):
+    resultados, collected = future.result()
+    metrics.replay(collected)
+    metrics.count(metrics.ROWS, amount=len(resultados))
+    return resultados
+
+def _render_pdf(report_text):
+    with metrics.stage('render_pdf'):
+        return render_medical_report_pdf(report_text)
+
+def calculate_summary(resultados):
+    status_counts = contar_estados(resultados)
     return {
-        'normal': int(status_counts.get('Normal', 0)),
-        'near': int(status_counts.get('Near', 0)),
-        'abnormal': int(status_counts.get('Low', 0) + status_counts.get('High', 0)),
-        'total': int(len(df))
+        'normal': status_counts['Normal'],
+        'near': status_counts['Near'],
+        'abnormal': status_counts['Low'] + status_counts['High'],
+        'total': len(resultados)
     }
 
+def _read_upload(index, file, spool_dirs):
+    # Returns (source, sha256 hex digest). The upload is read and hashed in chunks: small
+    # ones are parsed straight from memory, and once one grows past PDF_SPOOL_THRESHOLD it
+    # is copied to a spool file as it is read, so the worker never holds it whole
+    digest = hashlib.sha256()
+    buffer = destino = io.BytesIO()
+    spool = None
+    try:
+        while True:
+            chunk = file.stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            if spool is None and buffer.tell() + len(chunk) > PDF_SPOOL_THRESHOLD:
+                if not spool_dirs:
+                    spool_dirs.append(tempfile.mkdtemp())
+                spool = destino = open(os.path.join(spool_dirs[0], f"{index}_{secure_filename(file.filename)}"), 'wb')
+                spool.write(buffer.getvalue())
+                buffer = None
+            destino.write(chunk)
+    finally:
+        if spool is not None:
+            spool.close()
+    source = spool.name if spool is not None else buffer.getvalue()
+    return source, digest.hexdigest()
+
+def _remove_spool(spool_dirs):
+    for spool_dir in spool_dirs:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+def _store_report(user_id, report_date_str, resultados, records=None, content_hash=None):
+    # Storing is best effort: the analysis is still returned if the database write fails
+    try:
+        return guardar_reporte(user_id, report_date_str, resultados, records, content_hash)
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"No se pudieron guardar los resultados del usuario {user_id}: {e}")
+        return None
+
+def _encode_stream_record(record, stream_format):
+    body = json.dumps(record)
+    if stream_format == 'sse':
+        return f"event: {record['type']}\ndata: {body}\n\n"
+    return body + "\n"
+
+def _parallel_pages(source, rangos):
+    # Page ranges are extracted on the pool and sent in page order
+    for page, resultados, collected in iterar_analisis_paralelo(obtener_pool(), source, rangos):
+        metrics.replay(collected)
+        if resultados:
+            yield page, resultados
+
+def _stream_analysis(uploads, report_date_str, stream_format, user_id=None, content_hash=None):
+    # Emits 'results' records per page range of a large single upload (per file for smaller
+    # ones, cache hits and several uploads), a 'file' record when each file is done and a
+    # final 'summary'
+    all_results = []
+
+    def finish_file(filename, resultados):
+        if not resultados:
+            return {'type': 'file', 'filename': filename, 'error': 'No data could be extracted from this PDF.'}
+        all_results.extend(resultados)
+        return {'type': 'file', 'filename': filename, 'summary': calculate_summary(resultados)}
+
+    try:
+        pending = []
+        for filename, source, key in uploads:
+            cached = result_cache.get(key)
+            if cached is None:
+                pending.append((filename, source, key))
+                continue
+            if cached:
+                yield _encode_stream_record({'type': 'results', 'filename': filename, 'page': None, 'results': a_registros(cached)}, stream_format)
+            yield _encode_stream_record(finish_file(filename, cached), stream_format)
+
+        if len(pending) == 1:
+            filename, source, key = pending[0]
+            file_results = []
+            rangos = rangos_streaming(source)
+            if rangos is None:
+                # The pages could not be counted here; the pool runs the whole file and its error handling
+                resultados, collected = enviar_analisis(obtener_pool(), source).result()
+                metrics.replay(collected)
+                pages = [(None, resultados)]
+            else:
+                pages = _parallel_pages(source, rangos)
+            for page, resultados in pages:
+                if not resultados:
+                    continue
+                metrics.count(metrics.ROWS, amount=len(resultados))
+                file_results.extend(resultados)
+                yield _encode_stream_record({'type': 'results', 'filename': filename, 'page': page, 'results': a_registros(resultados)}, stream_format)
+            result_cache.set(key, file_results)
+            yield _encode_stream_record(finish_file(filename, file_results), stream_format)
+        elif pending:
+            futures = {
+                enviar_analisis(obtener_pool(), source): (filename, key)
+                for filename, source, key in pending
+            }
+            for future in as_completed(futures):
+                filename, key = futures[future]
+                resultados = _analysis_result(future)
+                result_cache.set(key, resultados)
+                if resultados:
+                    yield _encode_stream_record({'type': 'results', 'filename': filename, 'page': None, 'results': a_registros(resultados)}, stream_format)
+                yield _encode_stream_record(finish_file(filename, resultados), stream_format)
+
+        if not all_results:
+            yield _encode_stream_record({'type': 'error', 'error': 'No data could be extracted from this PDF.'}, stream_format)
+            return
+        summary = {
+            'type': 'summary',
+            'success': True,
+            'summary': calculate_summary(all_results),
+            'report_date': report_date_str
+        }
+        if user_id:
+            summary['timeline_id'] = _store_report(user_id, report_date_str, all_results, content_hash=content_hash)
+        yield _encode_stream_record(summary, stream_format)
+    except Exception as e:
+        yield _encode_stream_record({'type': 'error', 'error': f'Analysis failed due to: {str(e)}'}, stream_format)
+
 @app.route('/api/analyze', methods=['POST'])
 #@jwt_required() 
 def analyze_reports():
+    # Admission comes before the multipart body is parsed, read and hashed. A small body is
+    # cheap to read and may be answered from the cache, so it starts in the fast lane and
+    # moves to the analyze lane on a miss; a large or unsized one takes an analyze slot first
+    small = request.content_length is not None and request.content_length <= FAST_LANE_MAX_UPLOAD
+    try:
+        ticket = admission_lanes['fast' if small else 'analyze'].enter()
+    except OverloadedError as e:
+        return _overloaded(e)
+
+    streaming = False
+    spool_dirs = []
     try:
         if 'files' not in request.files:
             return jsonify({'error': 'No files provided'}), 400
         
-        files = request.files.getlist('files')
+        files = [f for f in request.files.getlist('files') if f.filename]
+        if not files:
+            return jsonify({'error': 'No files provided'}), 400
+
         report_date_str = request.form.get('date', datetime.now(timezone.utc).strftime('%Y-%m-%d'))
-        file = files[0]
-        
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            pdf_path = os.path.join(tmp_dir, secure_filename(file.filename))
-            file.save(pdf_path)
-            
-            lineas = extraer_texto_de_pdf(pdf_path) 
-            
-            df = parsear_lineas_a_dataframe(lineas)
-            
-            if not df.empty:
-                df = clasificar_resultados(df)
-            else:
-                return jsonify({'error': 'No data could be extracted from this PDF.'}), 400
-        
-        df = df.rename(columns={
-            'Test': 'test',
-            'Value': 'value',
-            'Unit': 'unit',
-            'Ref Low': 'refLow',
-            'Ref High': 'refHigh',
-            'Status': 'status'
-        })
-        
-        results_json = json.loads(df.to_json(orient='records'))
-        
-        return jsonify({
+        user_id = request.form.get('user_id', type=int)
+
+        uploads = []
+        digests = []
+        with metrics.stage('upload_read'):
+            for index, file in enumerate(files):
+                source, digest = _read_upload(index, file, spool_dirs)
+                digests.append(digest)
+                uploads.append((file.filename, source, content_key(digest, CACHE_VERSION)))
+        # Identifies the uploaded files, so storing the same report again updates its entry
+        content_hash = huella_reporte(digests)
+
+        if small and not all(result_cache.contains(key) for _, _, key in uploads):
+            # The fast slot is kept until the analyze one is granted (or refused)
+            analyze_ticket = admission_lanes['analyze'].enter()
+            ticket.release()
+            ticket = analyze_ticket
+
+        stream_format = request.args.get('stream')
+        if stream_format is None and request.accept_mimetypes.best == 'text/event-stream':
+            stream_format = 'sse'
+        if stream_format in ('ndjson', 'sse'):
+            mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+            stream = stream_with_context(_stream_analysis(uploads, report_date_str, stream_format, user_id, content_hash))
+            response = Response(stream, mimetype=mimetype,
+                                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+            # The slot and the spool files are kept until the stream has been sent (or the client has gone)
+            response.call_on_close(ticket.release)
+            response.call_on_close(lambda: _remove_spool(spool_dirs))
+            streaming = True
+            return response
+
+        return _analyze_json(uploads, report_date_str, user_id, content_hash)
+
+    except OverloadedError as e:
+        return _overloaded(e)
+    except Exception as e:
+        return jsonify({'error': f'Analysis failed due to: {str(e)}'}), 500
+    finally:
+        if not streaming:
+            ticket.release()
+            _remove_spool(spool_dirs)
+
+def _analyze_json(uploads, report_date_str, user_id, content_hash=None):
+    try:
+        per_file = [None] * len(uploads)
+        futures = {}
+        for index, (filename, source, key) in enumerate(uploads):
+            cached = result_cache.get(key)
+            if cached is not None:
+                per_file[index] = cached
+                continue
+            futures[index] = enviar_analisis(obtener_pool(), source)
+
+        for index, future in futures.items():
+            per_file[index] = _analysis_result(future)
+            result_cache.set(uploads[index][2], per_file[index])
+
+        # Records are built once from the result objects and serialized once by jsonify
+        file_results = []
+        for (filename, _, _), resultados in zip(uploads, per_file):
+            if not resultados:
+                file_results.append({
+                    'filename': filename,
+                    'error': 'No data could be extracted from this PDF.'
+                })
+                continue
+            file_results.append({
+                'filename': filename,
+                'results': a_registros(resultados),
+                'summary': calculate_summary(resultados)
+            })
+
+        all_results = [resultado for resultados in per_file for resultado in resultados]
+        if not all_results:
+            return jsonify({'error': 'No data could be extracted from this PDF.'}), 400
+
+        results_json = [row for entry in file_results for row in entry.get('results', [])]
+
+        response = {
             'success': True,
             'results': results_json,
-            'summary': calculate_summary_from_df(df), 
+            'summary': calculate_summary(all_results), 
+            'files': file_results,
             'report_date': report_date_str
-        })
+        }
+        if user_id:
+            response['timeline_id'] = _store_report(user_id, report_date_str, all_results, results_json, content_hash)
+        return jsonify(response)
         
     except Exception as e:
         return jsonify({'error': f'Analysis failed due to: {str(e)}'}), 500
     
+@app.route('/api/timeline/<int:user_id>/trend', methods=['GET'])
+#@jwt_required()
+def biomarker_trend(user_id):
+    test = request.args.get('test')
+    if not test:
+        return jsonify({'error': 'Missing test parameter'}), 400
+    try:
+        desde = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else None
+        hasta = datetime.strptime(request.args['to'], '%Y-%m-%d') if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'Dates must use the YYYY-MM-DD format'}), 400
+
+    return jsonify({
+        'test': test,
+        'points': tendencia(user_id, test, desde, hasta, request.args.get('limit', type=int))
+    })
+
+@app.route('/api/timeline/<int:user_id>/analytics', methods=['GET'])
+#@jwt_required()
+def timeline_analytics(user_id):
+    window = request.args.get('window', DEFAULT_WINDOW, type=int)
+    if not window or window < 1 or window > 50:
+        return jsonify({'error': 'window must be between 1 and 50'}), 400
+    return jsonify(analitica_usuario(user_id, window))
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admission-stats', methods=['GET'])
+def admission_stats():
+    return jsonify({name: lane.stats() for name, lane in admission_lanes.items()})
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify({'results': result_cache.stats(), 'reports': report_cache.stats(), 'analytics': analytics_cache.stats()})
+
 @app.route('/api/generate-pdf', methods=['POST'])
 #@jwt_required()
 def generate_pdf():
+    data = request.get_json(silent=True)
     try:
-        data = request.json
-        report_type = data.get('type', 'patient')
-        analysis_results_json = data.get('results', [])
-        
-        df = pd.DataFrame(analysis_results_json)
-        
-        if df.empty:
-            return jsonify({'error': 'No results to generate report from'}), 400
+        report_type, resultados = _report_request(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-        report_text = generar_reporte_ia(df, report_type)
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_pdf:
-            create_medical_report_pdf(temp_pdf.name, report_text)
-            temp_pdf_path = temp_pdf.name
+    try:
+        info = {}
+        with _report_lane(resultados, report_type).enter():
+            report_text = generar_reporte_ia(resultados, report_type, _previous_report(data, resultados), info)
+            pdf_bytes = _render_pdf(report_text)
             
-        return send_file(
-            temp_pdf_path,
+        response = send_file(
+            io.BytesIO(pdf_bytes),
             as_attachment=True,
             download_name=f'{report_type}_report.pdf',
             mimetype='application/pdf'
         )
+        response.headers.update(_prompt_headers(info))
+        return response
         
+    except OverloadedError as e:
+        return _overloaded(e)
     except Exception as e:
         app.logger.error(f"¡FALLO AL GENERAR PDF! Error: {e}")
         app.logger.error(traceback.format_exc()) 
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+def _previous_report(data, resultados):
+    # Incremental prompts need the patient's previous stored report; requests without a
+    # user_id, or with "incremental": false, get the full prompt
+    user_id = data.get('user_id')
+    if user_id is None or not data.get('incremental', True):
+        return None
+    try:
+        return reporte_anterior(int(user_id), data.get('timeline_id'), data.get('date'), resultados)
+    except Exception as e:
+        db.session.rollback()
+        app.logger.warning(f"No se pudo leer el reporte anterior del usuario {user_id}: {e}")
+        return None
+
+def _prompt_headers(info):
+    headers = {'X-Report-Mode': info.get('mode', 'full')}
+    if 'prompt_tokens_full' in info:
+        headers['X-Prompt-Tokens-Full'] = str(info['prompt_tokens_full'])
+        headers['X-Prompt-Tokens-Sent'] = str(info['prompt_tokens_sent'])
+    return headers
+
+REPORT_TYPES = ('patient', 'doctor')
+
+def _report_request(data):
+    # Checked before admission, so a malformed payload gets a 400 instead of failing
+    # halfway through a stream or inside a background job
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    report_type = data.get('type', 'patient')
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Unknown report type: {report_type}")
+    registros = data.get('results', [])
+    if not isinstance(registros, list) or not all(isinstance(registro, dict) for registro in registros):
+        raise ValueError("'results' must be a list of result objects")
+    if not registros:
+        raise ValueError('No results to generate report from')
+    return report_type, desde_registros(registros)
+
+def _report_lane(resultados, report_type):
+    # Reports whose text is already cached only need the PDF rendered
+    return admission_lanes['fast' if report_cache.contains(clave_reporte(resultados, report_type)) else 'report']
+
+def render_report_pdf(report_type, resultados):
+    report_text = generar_reporte_ia(resultados, report_type)
+    return _render_pdf(report_text)
+
+# Every gunicorn worker must see the same directory so any of them can answer status polls
+report_jobs = JobQueue(
+    render_report_pdf,
+    os.environ.get('REPORT_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'medilab-report-jobs')),
+    max_workers=int(os.environ.get('REPORT_WORKERS', 4)),
+    result_ttl=int(os.environ.get('REPORT_RESULT_TTL', 900)),
+    max_pending=int(os.environ.get('REPORT_QUEUE_MAX', 100))
+)
+
+@app.route('/api/generate-pdf/jobs', methods=['POST'])
+#@jwt_required()
+def submit_pdf_job():
+    try:
+        report_type, resultados = _report_request(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        job = report_jobs.submit(report_type, resultados)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+
+    return jsonify(dict(
+        job.to_dict(),
+        status_url=f'/api/generate-pdf/jobs/{job.id}',
+        download_url=f'/api/generate-pdf/jobs/{job.id}/download'
+    )), 202
+
+@app.route('/api/generate-pdf/jobs/<job_id>', methods=['GET'])
+#@jwt_required()
+def pdf_job_status(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/generate-pdf/jobs/<job_id>/download', methods=['GET'])
+#@jwt_required()
+def pdf_job_download(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    if job.status == 'failed':
+        return jsonify({'error': f'Server error: {job.error}'}), 500
+    if job.status != 'done':
+        return jsonify(job.to_dict()), 409
+    result = report_jobs.read_result(job)
+    if result is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+
+    return send_file(
+        io.BytesIO(result),
+        as_attachment=True,
+        download_name=f'{job.report_type}_report.pdf',
+        mimetype='application/pdf'
+    )
+
+def _stream_report(report_type, resultados, anterior=None):
+    chunks = []
+    info = {}
+    try:
+        for chunk in generar_reporte_ia_stream(resultados, report_type, anterior, info):
+            chunks.append(chunk)
+            yield _encode_stream_record({'type': 'chunk', 'text': chunk}, 'sse')
+
+        pdf_bytes = _render_pdf("".join(chunks))
+        job = report_jobs.add_finished(report_type, pdf_bytes)
+        yield _encode_stream_record(dict(
+            job.to_dict(),
+            type='done',
+            download_url=f'/api/generate-pdf/jobs/{job.id}/download',
+            report_mode=info.get('mode', 'full'),
+            prompt_tokens_full=info.get('prompt_tokens_full'),
+            prompt_tokens_sent=info.get('prompt_tokens_sent')
+        ), 'sse')
+    except Exception as e:
+        app.logger.error(f"¡FALLO AL GENERAR PDF! Error: {e}")
+        app.logger.error(traceback.format_exc())
+        yield _encode_stream_record({'type': 'error', 'error': f'Server error: {str(e)}'}, 'sse')
+
+@app.route('/api/generate-pdf/stream', methods=['POST'])
+#@jwt_required()
+def stream_pdf_report():
+    data = request.get_json(silent=True)
+    try:
+        report_type, resultados = _report_request(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        ticket = _report_lane(resultados, report_type).enter()
+    except OverloadedError as e:
+        return _overloaded(e)
+
+    anterior = _previous_report(data, resultados)
+    response = Response(_stream_report(report_type, resultados, anterior), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(ticket.release)
+    return response
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,355 @@
+"""End-to-end load test: concurrent users mixing uploads and report requests over HTTP.
+
+    python -m benchmarks.load --concurrency 16 --duration 60 --mix analyze=3 report=1 \\
+        --workers 4 --llm-latency-ms 1500 --output load.json
+
+By default the app is started here, under gunicorn with gunicorn.conf.py, with the stub
+LLM backend (LLM_BACKEND=stub, LLM_STUB_LATENCY_MS) standing in for Gemini, so runs
+need no network access and the model's latency is whatever is configured. --server
+flask uses Flask's threaded development server instead, and --url drives an app that is
+already running (its LLM backend is then whatever it was started with).
+
+Every user is a thread with its own keep-alive connection that sends one request after
+another, picking the endpoint by the --mix weights:
+
+  analyze        POST /api/analyze with one PDF from the corpus
+  report         POST /api/generate-pdf with the results of a corpus PDF
+  report_stream  POST /api/generate-pdf/stream, timed until the last event
+
+Uploads and report payloads are made unique per request (a comment appended to the
+PDF, a tiny change to one value), so the result and report caches do not answer them;
+--cache-hits sends them unchanged. Requests started during --warmup are not counted.
+The report gives, per endpoint, throughput, p50/p95/p99 latency and the error rate;
+429 answers from admission control are counted as errors and also listed by status.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlsplit
+from datetime import datetime, timezone
+
+ENDPOINTS = ('analyze', 'report', 'report_stream')
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _leer_corpus(directorio, reportes, paginas):
+    if directorio:
+        corpus = []
+        for nombre in sorted(os.listdir(directorio)):
+            if nombre.lower().endswith('.pdf'):
+                with open(os.path.join(directorio, nombre), 'rb') as f:
+                    corpus.append((nombre, f.read()))
+        if not corpus:
+            raise SystemExit(f"No PDFs found in {directorio}")
+        return corpus
+
+    from benchmarks.synthetic_reports import generar_corpus
+    return [(nombre, data) for nombre, _, data in generar_corpus(reportes, paginas)]
+
+
+def _resultados_del_corpus(corpus):
+    # Report payloads are built here, once, with the same pipeline the server runs
+    from pipeline import analizar_pdf
+    from resultados import a_registros
+
+    payloads = []
+    for _, data in corpus:
+        registros = a_registros(analizar_pdf(data))
+        if registros:
+            payloads.append(registros)
+    if not payloads:
+        raise SystemExit("No lab results could be parsed from the corpus")
+    return payloads
+
+
+def _multipart(campo, nombre, data):
+    limite = uuid.uuid4().hex
+    cuerpo = b"".join([
+        f"--{limite}\r\n".encode(),
+        f'Content-Disposition: form-data; name="{campo}"; filename="{nombre}"\r\n'.encode(),
+        b"Content-Type: application/pdf\r\n\r\n",
+        data,
+        f"\r\n--{limite}--\r\n".encode(),
+    ])
+    return cuerpo, f"multipart/form-data; boundary={limite}"
+
+
+class Usuario(threading.Thread):
+    """One closed-loop user: sends a request, waits for the full response, sends the next."""
+
+    def __init__(self, indice, destino, plan, corpus, payloads, cache_hits, fin, muestras):
+        super().__init__(name=f"load-user-{indice}", daemon=True)
+        self.destino = destino
+        self.plan = plan
+        self.corpus = corpus
+        self.payloads = payloads
+        self.cache_hits = cache_hits
+        self.fin = fin
+        self.muestras = muestras
+        self.rng = random.Random(indice)
+        self.conexion = None
+
+    def run(self):
+        nombres, pesos = zip(*self.plan)
+        while time.monotonic() < self.fin:
+            endpoint = self.rng.choices(nombres, pesos)[0]
+            inicio = time.monotonic()
+            try:
+                estado, ok = getattr(self, f"_{endpoint}")()
+            except (OSError, http.client.HTTPException):
+                # Connection refused or dropped: counted as an error and reconnected
+                estado, ok = 0, False
+                self._cerrar()
+            self.muestras.append((endpoint, inicio, time.monotonic() - inicio, estado, ok))
+        self._cerrar()
+
+    def _cerrar(self):
+        if self.conexion is not None:
+            self.conexion.close()
+            self.conexion = None
+
+    def _enviar(self, ruta, cuerpo, content_type):
+        if self.conexion is None:
+            self.conexion = http.client.HTTPConnection(self.destino.hostname, self.destino.port, timeout=300)
+        self.conexion.request('POST', ruta, body=cuerpo, headers={'Content-Type': content_type})
+        respuesta = self.conexion.getresponse()
+        return respuesta.status, respuesta.read()
+
+    def _analyze(self):
+        nombre, data = self.rng.choice(self.corpus)
+        if not self.cache_hits:
+            # Bytes after %%EOF are ignored by PDF readers but change the content hash
+            data = data + f"\n% load-test {uuid.uuid4().hex}\n".encode()
+        cuerpo, content_type = _multipart('files', nombre, data)
+        estado, _ = self._enviar('/api/analyze', cuerpo, content_type)
+        return estado, estado == 200
+
+    def _payload_reporte(self):
+        registros = self.rng.choice(self.payloads)
+        if not self.cache_hits:
+            registros = [dict(registro) for registro in registros]
+            objetivo = next((r for r in registros if r['value'] is not None), None)
+            if objetivo is not None:
+                objetivo['value'] = round(objetivo['value'] + self.rng.uniform(0.0001, 0.001), 6)
+        return json.dumps({'type': self.rng.choice(['doctor', 'patient']), 'results': registros}).encode()
+
+    def _report(self):
+        estado, _ = self._enviar('/api/generate-pdf', self._payload_reporte(), 'application/json')
+        return estado, estado == 200
+
+    def _report_stream(self):
+        estado, cuerpo = self._enviar('/api/generate-pdf/stream', self._payload_reporte(), 'application/json')
+        # Failures after the stream has started arrive as an error event with status 200
+        return estado, estado == 200 and b'"type": "done"' in cuerpo
+
+
+def _percentil(ordenados, p):
+    # Nearest rank
+    if not ordenados:
+        return None
+    return ordenados[min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados))) - 1))]
+
+
+def resumir(muestras, inicio_medicion, segundos):
+    por_endpoint = {}
+    for endpoint, inicio, latencia, estado, ok in muestras:
+        if inicio < inicio_medicion:
+            continue
+        datos = por_endpoint.setdefault(endpoint, {'latencias': [], 'errores': 0, 'estados': {}})
+        datos['latencias'].append(latencia)
+        datos['errores'] += not ok
+        datos['estados'][str(estado)] = datos['estados'].get(str(estado), 0) + 1
+
+    resumen = {}
+    for endpoint, datos in sorted(por_endpoint.items()):
+        latencias = sorted(datos['latencias'])
+        total = len(latencias)
+        resumen[endpoint] = {
+            'requests': total,
+            'errors': datos['errores'],
+            'error_rate': datos['errores'] / total,
+            'throughput_rps': (total - datos['errores']) / segundos,
+            'p50_ms': _percentil(latencias, 50) * 1000,
+            'p95_ms': _percentil(latencias, 95) * 1000,
+            'p99_ms': _percentil(latencias, 99) * 1000,
+            'max_ms': latencias[-1] * 1000,
+            'status_codes': datos['estados'],
+        }
+    return resumen
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(tipo, workers, threads, latencia_ms, tmp):
+    puerto = _puerto_libre()
+    env = dict(
+        os.environ,
+        LLM_BACKEND='stub',
+        LLM_STUB_LATENCY_MS=str(latencia_ms),
+        DATABASE_URL=os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(tmp, 'load.db')}"),
+    )
+    if tipo == 'gunicorn':
+        comando = [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{puerto}',
+                   '--workers', str(workers), '--threads', str(threads), '--timeout', '300']
+    else:
+        comando = [sys.executable, '-c',
+                   f"from app import app; app.run(host='127.0.0.1', port={puerto}, threaded=True)"]
+    log = open(os.path.join(tmp, 'server.log'), 'wb')
+    proceso = subprocess.Popen(comando, cwd=RAIZ, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise SystemExit(f"The {tipo} server exited during startup; see {log.name}")
+        try:
+            conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=2)
+            conexion.request('GET', '/metrics')
+            if conexion.getresponse().status == 200:
+                conexion.close()
+                return proceso, f"http://127.0.0.1:{puerto}"
+        except OSError:
+            time.sleep(0.2)
+    proceso.terminate()
+    raise SystemExit(f"The {tipo} server did not answer within 60s; see {log.name}")
+
+
+def detener_servidor(proceso):
+    proceso.terminate()
+    try:
+        proceso.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+        proceso.wait()
+
+
+def ejecutar(args, plan):
+    corpus = _leer_corpus(args.corpus, args.reports, args.pages)
+    payloads = _resultados_del_corpus(corpus) if any(n != 'analyze' for n, _ in plan) else []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        proceso = None
+        url = args.url
+        if url is None:
+            proceso, url = iniciar_servidor(args.server, args.workers, args.threads, args.llm_latency_ms, tmp)
+        try:
+            muestras = []
+            inicio = time.monotonic()
+            inicio_medicion = inicio + args.warmup
+            fin = inicio_medicion + args.duration
+            usuarios = [
+                Usuario(indice, urlsplit(url), plan, corpus, payloads, args.cache_hits, fin, muestras)
+                for indice in range(args.concurrency)
+            ]
+            for usuario in usuarios:
+                usuario.start()
+            for usuario in usuarios:
+                usuario.join()
+            # Requests still running at the deadline finish and are counted, so the
+            # measured window ends when the last one does
+            segundos = max(time.monotonic() - inicio_medicion, 1e-9)
+        finally:
+            if proceso is not None:
+                detener_servidor(proceso)
+
+    endpoints = resumir(muestras, inicio_medicion, segundos)
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {
+            'url': args.url,
+            'server': None if args.url else args.server,
+            'workers': args.workers,
+            'threads': args.threads,
+            'llm_latency_ms': None if args.url else args.llm_latency_ms,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'mix': dict(plan),
+            'corpus_files': len(corpus),
+            'cache_hits': args.cache_hits,
+        },
+        'measured_s': segundos,
+        'total_throughput_rps': sum(datos['throughput_rps'] for datos in endpoints.values()),
+        'endpoints': endpoints,
+    }
+
+
+def imprimir(resultados):
+    columnas = ['requests', 'error_rate', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+    print(f"{'endpoint':<15}" + "".join(f"{c:>16}" for c in columnas))
+    for endpoint, datos in resultados['endpoints'].items():
+        celdas = [
+            f"{datos['requests']:>16d}",
+            f"{datos['error_rate'] * 100:>15.1f}%",
+            f"{datos['throughput_rps']:>16.2f}",
+        ] + [f"{datos[c]:>16.1f}" for c in columnas[3:]]
+        print(f"{endpoint:<15}" + "".join(celdas))
+        errores = {estado: n for estado, n in datos['status_codes'].items() if estado != '200'}
+        if errores:
+            print(f"{'':<15}non-200 answers: {errores}")
+    print(f"total throughput: {resultados['total_throughput_rps']:.2f} req/s over {resultados['measured_s']:.1f}s")
+
+
+def _plan(mix):
+    plan = []
+    for parte in mix:
+        nombre, _, peso = parte.partition('=')
+        if nombre not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {nombre!r} (choose from {', '.join(ENDPOINTS)})")
+        plan.append((nombre, float(peso or 1)))
+    if not any(peso > 0 for _, peso in plan):
+        raise argparse.ArgumentTypeError("the request mix needs at least one positive weight")
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the app's endpoints with concurrent users over HTTP")
+    parser.add_argument('--url', help="an app that is already running, e.g. http://127.0.0.1:5000")
+    parser.add_argument('--server', choices=['gunicorn', 'flask'], default='gunicorn',
+                        help="how the app is started when --url is not given")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument('--threads', type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument('--llm-latency-ms', type=float, default=float(os.environ.get('LLM_STUB_LATENCY_MS', 1000)),
+                        help="latency of the stub LLM backend")
+    parser.add_argument('--concurrency', type=int, default=8, help="simultaneous users")
+    parser.add_argument('--duration', type=float, default=30, help="measured seconds")
+    parser.add_argument('--warmup', type=float, default=5, help="seconds of load before measuring")
+    parser.add_argument('--mix', nargs='+', default=['analyze=3', 'report=1'],
+                        help="endpoint=weight pairs, from: " + ", ".join(ENDPOINTS))
+    parser.add_argument('--corpus', help="directory of PDFs to upload (default: synthetic reports)")
+    parser.add_argument('--reports', type=int, default=4, help="synthetic reports per page count")
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 3, 10], help="synthetic page counts")
+    parser.add_argument('--cache-hits', action='store_true', help="send repeated uploads and payloads unchanged")
+    parser.add_argument('--output', help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    try:
+        plan = _plan(args.mix)
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        parser.error(str(e))
+
+    resultados = ejecutar(args, plan)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(resultados, indent=2))
+    imprimir(resultados)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
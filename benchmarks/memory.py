@@ -0,0 +1,157 @@
+"""Peak-memory benchmark: extraction memory against document length.
+
+    python -m benchmarks.memory --pages 10 40 160 --output memory.json
+
+Every measurement runs in a new interpreter, after the libraries are imported, and
+records the peak of the Python heap (tracemalloc) and the growth of the process's
+resident high-water mark while one synthetic PDF is analysed. Modes:
+
+  stream     pipeline.analizar_pdf, as /api/analyze and ingest.py run it: pages are
+             parsed one at a time and pdfplumber pages are closed after extraction
+  dataframe  parsear_paginas_a_dataframe over iterar_paginas, then clasificar_resultados
+  retained   pdfplumber with every page kept open until the end, as before pages were
+             released; only meaningful with --backend pdfplumber
+
+With streaming, the peak should stay nearly flat as pages are added (what remains is
+the result rows themselves); with retained pages it grows with the document.
+"""
+import os
+import sys
+import json
+import platform
+import argparse
+import resource
+import subprocess
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+
+MODOS = ('stream', 'dataframe', 'retained')
+
+
+def _rss_maximo_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo / (1024 * 1024) if sys.platform == 'darwin' else maximo / 1024
+
+
+def _retenido(pdf_path):
+    import pdfplumber
+    from data_extractor import parsear_lineas, clasificar
+
+    with pdfplumber.open(pdf_path) as pdf:
+        lineas = []
+        for page in pdf.pages:
+            lineas.extend((page.extract_text() or "").split("\n"))
+        return len(clasificar(parsear_lineas(lineas)))
+
+
+def medir_proceso(modo, backend, pdf_path):
+    """Runs inside the fresh interpreter and returns its measurements."""
+    # The libraries are imported and one full run is made before measuring, so imports,
+    # lazily built tables and first-use caches are not counted
+    import numpy
+    import pandas
+    import pdfplumber
+    import pipeline
+    from pdf_processor import iterar_paginas
+    from data_extractor import parsear_paginas_a_dataframe, clasificar_resultados
+
+    pipeline.analizar_pdf(pdf_path, backend)
+
+    base = _rss_maximo_mb()
+    tracemalloc.start()
+    if modo == 'stream':
+        filas = len(pipeline.analizar_pdf(pdf_path, backend))
+    elif modo == 'dataframe':
+        filas = len(clasificar_resultados(parsear_paginas_a_dataframe(iterar_paginas(pdf_path, backend))))
+    else:
+        filas = _retenido(pdf_path)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'rows': filas,
+        'peak_python_mb': pico / (1024 * 1024),
+        'rss_growth_mb': _rss_maximo_mb() - base,
+    }
+
+
+def _ejecutar_hijo(modo, backend, pdf_path):
+    salida = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.memory', '--child', modo, '--backend', backend, '--pdf', pdf_path],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def _pendiente(puntos):
+    # MB per 100 pages between the shortest and the longest document
+    (paginas_a, mb_a), (paginas_b, mb_b) = puntos[0], puntos[-1]
+    return (mb_b - mb_a) / (paginas_b - paginas_a) * 100 if paginas_b != paginas_a else 0.0
+
+
+def ejecutar(paginas, modos, backend):
+    from benchmarks.synthetic_reports import generar_pdf
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        rutas = {}
+        for total in paginas:
+            rutas[total] = os.path.join(tmp, f'report_{total}.pdf')
+            with open(rutas[total], 'wb') as f:
+                f.write(generar_pdf(total, 0))
+
+        for modo in modos:
+            corridas = {total: _ejecutar_hijo(modo, backend, rutas[total]) for total in paginas}
+            resultados[modo] = {
+                'runs': {str(total): corrida for total, corrida in corridas.items()},
+                'python_mb_per_100_pages': _pendiente([(t, c['peak_python_mb']) for t, c in corridas.items()]),
+                'rss_mb_per_100_pages': _pendiente([(t, c['rss_growth_mb']) for t, c in corridas.items()]),
+            }
+
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': backend,
+        'pages': paginas,
+        'modes': resultados,
+    }
+
+
+def imprimir(resultados):
+    paginas = resultados['pages']
+    print(f"backend: {resultados['backend']}   peak Python heap / RSS growth in MB")
+    print(f"{'mode':<11}" + "".join(f"{f'{total} pages':>18}" for total in paginas) + f"{'per 100 pages':>18}")
+    for modo, datos in resultados['modes'].items():
+        celdas = [
+            f"{datos['runs'][str(total)]['peak_python_mb']:>8.1f} /{datos['runs'][str(total)]['rss_growth_mb']:>7.1f}"
+            for total in paginas
+        ]
+        pendiente = f"{datos['python_mb_per_100_pages']:>8.1f} /{datos['rss_mb_per_100_pages']:>7.1f}"
+        print(f"{modo:<11}" + "".join(f"{celda:>18}" for celda in celdas) + f"{pendiente:>18}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak extraction memory as documents get longer")
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 40, 160])
+    parser.add_argument('--modes', nargs='+', choices=MODOS, default=list(MODOS))
+    parser.add_argument('--backend', default='pdfplumber')
+    parser.add_argument('--output', help="write the JSON results to this file")
+    parser.add_argument('--child', choices=MODOS, help=argparse.SUPPRESS)
+    parser.add_argument('--pdf', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(medir_proceso(args.child, args.backend, args.pdf)))
+        return
+
+    resultados = ejecutar(sorted(args.pages), args.modes, args.backend)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(resultados, indent=2))
+    imprimir(resultados)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
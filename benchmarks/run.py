@@ -0,0 +1,176 @@
+"""Per-stage benchmarks for the analysis and report pipeline.
+
+    python -m benchmarks.run --reports 5 --pages 1 5 20 --output bench.json
+    python -m benchmarks.run --reports 5 --pages 1 5 20 --compare bench.json
+
+Every stage is timed on its own over a deterministic synthetic corpus and the
+results are written as JSON, so runs from different commits can be compared.
+The LLM is always the local stub backend, so no network access is needed.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from benchmarks.synthetic_reports import generar_corpus
+from pdf_processor import BACKENDS, extraer_con_backend
+from data_extractor import parsear_lineas, clasificar
+from resultados import a_registros
+from llm_client import StubBackend, configurar_llm
+from report_generator import generar_reporte_ia, render_medical_report_pdf, report_cache
+
+
+def _medir(funcion, repeticiones):
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos, resultado
+
+
+def _resumen(tiempos, unidades=None):
+    tiempos = sorted(tiempos)
+    resumen = {
+        'runs': len(tiempos),
+        'total_s': sum(tiempos),
+        'min_s': tiempos[0],
+        'median_s': statistics.median(tiempos),
+        'mean_s': statistics.fmean(tiempos),
+        'p95_s': tiempos[min(len(tiempos) - 1, int(round(0.95 * (len(tiempos) - 1))))],
+    }
+    if unidades:
+        for nombre, cantidad in unidades.items():
+            resumen[f'{nombre}_per_s'] = cantidad / resumen['total_s'] if resumen['total_s'] else 0.0
+    return resumen
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ejecutar(reportes, paginas, repeticiones, seed, backends):
+    corpus = list(generar_corpus(reportes, paginas, seed))
+    total_paginas = sum(paginas_reporte for _, paginas_reporte, _ in corpus)
+    etapas = {}
+
+    lineas_por_reporte = None
+    for backend in backends:
+        tiempos = []
+        lineas_backend = []
+        for _, _, data in corpus:
+            t, lineas = _medir(lambda: extraer_con_backend(data, backend), repeticiones)
+            tiempos.extend(t)
+            lineas_backend.append(lineas)
+        etapas[f'extract_{backend}'] = _resumen(tiempos, {'pages': total_paginas * repeticiones})
+        if lineas_por_reporte is None:
+            lineas_por_reporte = lineas_backend
+
+    tiempos = []
+    parseados = []
+    for lineas in lineas_por_reporte:
+        t, resultados = _medir(lambda: parsear_lineas(lineas), repeticiones)
+        tiempos.extend(t)
+        parseados.append(resultados)
+    total_filas = sum(len(resultados) for resultados in parseados)
+    etapas['parse'] = _resumen(tiempos, {'lines': sum(len(l) for l in lineas_por_reporte) * repeticiones, 'rows': total_filas * repeticiones})
+
+    tiempos = []
+    clasificados = []
+    for resultados in parseados:
+        t, clasificado = _medir(lambda: clasificar(resultados), repeticiones)
+        tiempos.extend(t)
+        clasificados.append(clasificado)
+    etapas['classify'] = _resumen(tiempos, {'rows': total_filas * repeticiones})
+
+    # Same path analyze_reports takes to build its response body
+    tiempos = []
+    for resultados in clasificados:
+        t, _ = _medir(lambda: json.dumps(a_registros(resultados)), repeticiones)
+        tiempos.extend(t)
+    etapas['serialize_json'] = _resumen(tiempos, {'rows': total_filas * repeticiones})
+
+    configurar_llm(StubBackend(latency=0))
+    tiempos_llm = []
+    tiempos_pdf = []
+    for resultados in clasificados:
+        for _ in range(repeticiones):
+            report_cache.clear()
+            inicio = time.perf_counter()
+            texto = generar_reporte_ia(resultados, 'doctor')
+            tiempos_llm.append(time.perf_counter() - inicio)
+            t, _ = _medir(lambda: render_medical_report_pdf(texto), 1)
+            tiempos_pdf.extend(t)
+    etapas['report_text_stub'] = _resumen(tiempos_llm)
+    etapas['render_pdf'] = _resumen(tiempos_pdf, {'reports': len(tiempos_pdf)})
+
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'corpus': {
+            'reports_per_size': reportes,
+            'pages': list(paginas),
+            'seed': seed,
+            'files': len(corpus),
+            'total_pages': total_paginas,
+            'total_rows': total_filas,
+        },
+        'repeat': repeticiones,
+        'stages': etapas,
+    }
+
+
+def comparar(actual, anterior):
+    print(f"{'stage':<22}{'before (ms)':>14}{'after (ms)':>14}{'change':>10}")
+    for etapa, datos in actual['stages'].items():
+        previo = anterior.get('stages', {}).get(etapa)
+        despues = datos['median_s'] * 1000
+        if previo is None:
+            print(f"{etapa:<22}{'-':>14}{despues:>14.3f}{'new':>10}")
+            continue
+        antes = previo['median_s'] * 1000
+        cambio = (despues - antes) / antes * 100 if antes else 0.0
+        print(f"{etapa:<22}{antes:>14.3f}{despues:>14.3f}{cambio:>+9.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the lab-report pipeline")
+    parser.add_argument('--reports', type=int, default=3, help="reports per page count")
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backends', nargs='+', default=sorted(BACKENDS))
+    parser.add_argument('--output', help="write the JSON results to this file")
+    parser.add_argument('--compare', help="previous JSON results to compare against")
+    args = parser.parse_args()
+
+    resultados = ejecutar(args.reports, args.pages, args.repeat, args.seed, args.backends)
+    texto = json.dumps(resultados, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    if args.compare:
+        with open(args.compare) as f:
+            comparar(resultados, json.load(f))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
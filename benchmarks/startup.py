@@ -0,0 +1,183 @@
+"""Startup-time benchmark: how long until a fresh process serves its first requests.
+
+    python -m benchmarks.startup --runs 5 --output startup.json
+
+Every run starts a new interpreter, so nothing is shared with this process. Modes:
+
+  lazy       import app.py, then the first /api/analyze and /api/generate-pdf requests
+             pay for the heavy libraries they touch
+  warm       import app.py and run warmup.precalentar() before the first requests
+  preforked  like gunicorn with the config in gunicorn.conf.py: the "master" imports and
+             warms up, then forks a worker and the first requests are timed in the worker
+
+The LLM is always the stub backend, so no network access is needed.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+MODOS = ('lazy', 'warm', 'preforked')
+
+
+def _primeras_peticiones(aplicacion, pdf_path):
+    with open(pdf_path, 'rb') as f:
+        data = f.read()
+    client = aplicacion.test_client()
+    tiempos = {}
+
+    inicio = time.perf_counter()
+    respuesta = client.post('/api/analyze', data={'files': (io.BytesIO(data), 'report.pdf')},
+                            content_type='multipart/form-data')
+    tiempos['first_analyze_s'] = time.perf_counter() - inicio
+    if respuesta.status_code != 200:
+        raise RuntimeError(f"/api/analyze returned {respuesta.status_code}")
+
+    inicio = time.perf_counter()
+    respuesta = client.post('/api/generate-pdf', json={'type': 'doctor', 'results': respuesta.get_json()['results']})
+    tiempos['first_report_s'] = time.perf_counter() - inicio
+    if respuesta.status_code != 200:
+        raise RuntimeError(f"/api/generate-pdf returned {respuesta.status_code}")
+    return tiempos
+
+
+def _apagar_pools():
+    # The analysis pool is created by the first request; shut it down explicitly so a
+    # forked worker leaving through os._exit does not strand its processes
+    import pipeline
+    if pipeline._pool is not None:
+        pipeline._pool.shutdown()
+
+
+def medir_proceso(modo, pdf_path):
+    """Runs inside the fresh interpreter and returns its timings."""
+    inicio = time.perf_counter()
+    import app as aplicacion
+    tiempos = {'import_app_s': time.perf_counter() - inicio}
+
+    if modo in ('warm', 'preforked'):
+        from warmup import precalentar
+        inicio = time.perf_counter()
+        precalentar(congelar=modo == 'preforked')
+        tiempos['warmup_s'] = time.perf_counter() - inicio
+
+    if modo != 'preforked':
+        tiempos.update(_primeras_peticiones(aplicacion.app, pdf_path))
+        _apagar_pools()
+        return tiempos
+
+    lectura, escritura = os.pipe()
+    inicio_fork = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(lectura)
+        codigo = 0
+        try:
+            resultado = _primeras_peticiones(aplicacion.app, pdf_path)
+            resultado['fork_s'] = time.perf_counter() - inicio_fork - sum(resultado.values())
+        except Exception as e:
+            resultado = {'error': str(e)}
+            codigo = 1
+        _apagar_pools()
+        os.write(escritura, json.dumps(resultado).encode('utf-8'))
+        os._exit(codigo)
+
+    os.close(escritura)
+    partes = []
+    while True:
+        parte = os.read(lectura, 65536)
+        if not parte:
+            break
+        partes.append(parte)
+    os.close(lectura)
+    os.waitpid(pid, 0)
+    resultado = json.loads(b''.join(partes))
+    if 'error' in resultado:
+        raise RuntimeError(resultado['error'])
+    tiempos.update(resultado)
+    return tiempos
+
+
+def _ejecutar_hijo(modo, pdf_path):
+    env = dict(os.environ, LLM_BACKEND='stub', LLM_STUB_LATENCY_MS='0',
+               DATABASE_URL=os.environ.get('DATABASE_URL', 'sqlite://'))
+    salida = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.startup', '--child', modo, '--pdf', pdf_path],
+        env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def _resumen(valores):
+    valores = sorted(valores)
+    return {'runs': len(valores), 'min_s': valores[0], 'median_s': statistics.median(valores), 'max_s': valores[-1]}
+
+
+def ejecutar(runs, paginas, modos):
+    from benchmarks.synthetic_reports import generar_pdf
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, 'report.pdf')
+        with open(pdf_path, 'wb') as f:
+            f.write(generar_pdf(paginas, 0))
+
+        resultados = {}
+        for modo in modos:
+            corridas = [_ejecutar_hijo(modo, pdf_path) for _ in range(runs)]
+            for corrida in corridas:
+                # From the start of the worker (fork, or interpreter start) to its first report
+                previo = corrida.get('fork_s', corrida['import_app_s'] + corrida.get('warmup_s', 0.0))
+                corrida['ready_to_first_report_s'] = previo + corrida['first_analyze_s'] + corrida['first_report_s']
+            resultados[modo] = {
+                metrica: _resumen([corrida[metrica] for corrida in corridas])
+                for metrica in corridas[0]
+            }
+
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pages': paginas,
+        'modes': resultados,
+    }
+
+
+def imprimir(resultados):
+    metricas = ['import_app_s', 'warmup_s', 'fork_s', 'first_analyze_s', 'first_report_s', 'ready_to_first_report_s']
+    print(f"{'mode':<12}" + "".join(f"{m[:-2]:>24}" for m in metricas))
+    for modo, datos in resultados['modes'].items():
+        celdas = [f"{datos[m]['median_s'] * 1000:>21.1f} ms" if m in datos else f"{'-':>24}" for m in metricas]
+        print(f"{modo:<12}" + "".join(celdas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time from process start to the first analyze/report requests")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--pages', type=int, default=2, help="pages of the synthetic report that is uploaded")
+    parser.add_argument('--modes', nargs='+', choices=MODOS, default=list(MODOS))
+    parser.add_argument('--output', help="write the JSON results to this file")
+    parser.add_argument('--child', choices=MODOS, help=argparse.SUPPRESS)
+    parser.add_argument('--pdf', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(medir_proceso(args.child, args.pdf)))
+        return
+
+    resultados = ejecutar(args.runs, args.pages, args.modes)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(resultados, indent=2))
+    imprimir(resultados)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
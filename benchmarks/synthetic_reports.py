@@ -0,0 +1,118 @@
+"""Deterministic synthetic lab-report PDFs for benchmarks.
+
+    python -m benchmarks.synthetic_reports --out corpus/ --reports 20 --pages 1 5 20
+"""
+import io
+import os
+import random
+import argparse
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+# (name, unit, low, high, format) -- format is "range", "below" (< limit) or "above" (> limit)
+BIOMARKERS = [
+    ("Hemoglobina", "g/dL", 12.0, 17.0, "range"),
+    ("Hematocrito", "%", 36.0, 50.0, "range"),
+    ("Leucocitos", "10*3/uL", 4.0, 11.0, "range"),
+    ("Plaquetas", "10*3/uL", 150.0, 450.0, "range"),
+    ("VCM", "fL", 80.0, 100.0, "range"),
+    ("Glucose", "mg/dL", 70.0, 100.0, "range"),
+    ("Creatinine", "mg/dL", 0.6, 1.3, "range"),
+    ("Urea", "mg/dL", 15.0, 45.0, "range"),
+    ("Sodium", "mmol/L", 135.0, 145.0, "range"),
+    ("Potassium", "mmol/L", 3.5, 5.1, "range"),
+    ("TSH", "µUI/mL", 0.4, 4.0, "range"),
+    ("T4 Libre", "ng/dL", 0.8, 1.8, "range"),
+    ("Ferritina", "ng/mL", 30.0, 400.0, "range"),
+    ("Vitamin B12", "pg/mL", 200.0, 900.0, "range"),
+    ("HbA1c", "%", 4.0, 5.6, "range"),
+    ("Colesterol Total", "mg/dL", 0.0, 200.0, "below"),
+    ("LDL", "mg/dL", 0.0, 130.0, "below"),
+    ("Trigliceridos", "mg/dL", 0.0, 150.0, "below"),
+    ("PCR", "mg/L", 0.0, 5.0, "below"),
+    ("HDL", "mg/dL", 40.0, None, "above"),
+    ("eGFR", "mL/min/1.73 m2", 60.0, None, "above"),
+]
+
+FILLER = [
+    "Laboratorio Central de Analisis Clinicos",
+    "Paciente: Juan Perez  DNI 12345678",
+    "Fecha de extraccion: 12/03/2024",
+    "Determinacion Resultado Unidades Valores de referencia",
+    "Muestra obtenida 08:30 hs",
+    "Validado por Dr. Lopez M.P. 4432",
+]
+
+
+def _formatear(valor, decimales, coma):
+    texto = f"{valor:.{decimales}f}"
+    return texto.replace(".", ",") if coma else texto
+
+
+def generar_lineas(rng, tests_por_pagina):
+    """Returns the text lines for one page, mixing every supported result format."""
+    lineas = [rng.choice(FILLER), rng.choice(FILLER)]
+    for _ in range(tests_por_pagina):
+        nombre, unidad, bajo, alto, formato = rng.choice(BIOMARKERS)
+        coma = rng.random() < 0.3
+        decimales = 1 if alto is None or alto >= 10 else 2
+        if formato == "range":
+            valor = rng.uniform(bajo * 0.6, alto * 1.4)
+            rango = f"{_formatear(bajo, decimales, coma)} - {_formatear(alto, decimales, coma)}"
+            if rng.random() < 0.2:
+                rango = f"[{_formatear(bajo, decimales, coma)} {_formatear(alto, decimales, coma)}]"
+            lineas.append(f"{nombre} {_formatear(valor, decimales, coma)} {unidad} {rango}")
+        elif formato == "below":
+            valor = rng.uniform(alto * 0.5, alto * 1.5)
+            lineas.append(f"{nombre} {_formatear(valor, decimales, coma)} {unidad} < {_formatear(alto, decimales, coma)}")
+        else:
+            valor = rng.uniform(bajo * 0.5, bajo * 2.0)
+            lineas.append(f"{nombre} {_formatear(valor, decimales, coma)} {unidad} > {_formatear(bajo, decimales, coma)}")
+    return lineas
+
+
+def generar_pdf(paginas, seed=0, tests_por_pagina=25):
+    """Builds one synthetic report and returns its bytes."""
+    rng = random.Random(seed)
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    for numero in range(1, paginas + 1):
+        y = 750
+        for linea in generar_lineas(rng, tests_por_pagina) + [f"Page {numero} of {paginas}"]:
+            pdf.drawString(50, y, linea)
+            y -= 14
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def generar_corpus(reportes=10, paginas=(1, 3, 10), seed=0, tests_por_pagina=25):
+    """Yields (name, page count, pdf bytes) for every report/page-count combination."""
+    for paginas_reporte in paginas:
+        for indice in range(reportes):
+            semilla = seed * 1_000_003 + paginas_reporte * 1009 + indice
+            nombre = f"report_{paginas_reporte:03d}p_{indice:04d}.pdf"
+            yield nombre, paginas_reporte, generar_pdf(paginas_reporte, semilla, tests_por_pagina)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic lab-report PDF corpus")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--reports", type=int, default=10)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 3, 10])
+    parser.add_argument("--tests-per-page", type=int, default=25)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    total = 0
+    for nombre, _, data in generar_corpus(args.reports, args.pages, args.seed, args.tests_per_page):
+        with open(os.path.join(args.out, nombre), "wb") as f:
+            f.write(data)
+        total += 1
+    print(f"{total} PDFs written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import unicodedata
+
+# (canonical id, display name, aliases) -- aliases are matched case- and accent-insensitively
+# with runs of whitespace collapsed, so "HEMOGLOBINA", "Hemoglobína" and "Hemoglobin  (Hb)"
+# all map to the same id. Add new lab spellings here rather than in the parser patterns.
+BIOMARCADORES = [
+    ("hemoglobin", "Hemoglobin", ["Hemoglobina", "Hemoglobin", "Hemoglobin (Hb)", "Hemoglobina (Hb)", "Hb", "HGB"]),
+    ("hematocrit", "Hematocrit", ["Hematocrito", "Hematocrit", "Hematocrit (Hct)", "Hto", "Hct", "HCT"]),
+    ("wbc", "White blood cells", ["Leucocitos", "Leucocitos totales", "Globulos blancos", "White blood cells",
+                                  "White Blood Cell Count", "Leukocytes", "WBC"]),
+    ("rbc", "Red blood cells", ["Hematies", "Eritrocitos", "Globulos rojos", "Red blood cells",
+                                "Red Blood Cell Count", "Erythrocytes", "RBC"]),
+    ("platelets", "Platelets", ["Plaquetas", "Recuento de plaquetas", "Platelets", "Platelet count", "PLT"]),
+    ("mcv", "Mean corpuscular volume", ["VCM", "Volumen corpuscular medio", "MCV", "Mean corpuscular volume"]),
+    ("mch", "Mean corpuscular hemoglobin", ["HCM", "Hemoglobina corpuscular media", "MCH"]),
+    ("mchc", "Mean corpuscular hemoglobin concentration", ["CHCM", "MCHC"]),
+    ("rdw", "Red cell distribution width", ["ADE", "RDW", "RDW-CV"]),
+    ("glucose", "Glucose", ["Glucosa", "Glucosa basal", "Glucemia", "Glucose", "Fasting glucose", "Glucose (fasting)"]),
+    ("hba1c", "Hemoglobin A1c", ["HbA1c", "Hemoglobina glicosilada", "Hemoglobina glicada", "Hemoglobin A1c", "A1c"]),
+    ("creatinine", "Creatinine", ["Creatinina", "Creatinine"]),
+    ("urea", "Urea", ["Urea", "Uremia"]),
+    ("bun", "Blood urea nitrogen", ["BUN", "Nitrogeno ureico", "Blood urea nitrogen"]),
+    ("egfr", "Estimated GFR", ["eGFR", "Filtrado glomerular", "Filtrado glomerular estimado", "GFR", "Estimated GFR"]),
+    ("uric_acid", "Uric acid", ["Acido urico", "Uric acid"]),
+    ("sodium", "Sodium", ["Sodio", "Sodium", "Na"]),
+    ("potassium", "Potassium", ["Potasio", "Potassium", "K"]),
+    ("chloride", "Chloride", ["Cloro", "Cloruro", "Chloride", "Cl"]),
+    ("calcium", "Calcium", ["Calcio", "Calcio total", "Calcium", "Ca"]),
+    ("magnesium", "Magnesium", ["Magnesio", "Magnesium", "Mg"]),
+    ("phosphorus", "Phosphorus", ["Fosforo", "Phosphorus", "Phosphate"]),
+    ("iron", "Iron", ["Hierro", "Hierro serico", "Sideremia", "Iron", "Serum iron"]),
+    ("ferritin", "Ferritin", ["Ferritina", "Ferritin"]),
+    ("transferrin", "Transferrin", ["Transferrina", "Transferrin"]),
+    ("vitamin_b12", "Vitamin B12", ["Vitamina B12", "Vitamin B12", "Cobalamina", "Cobalamin"]),
+    ("folate", "Folate", ["Acido folico", "Folato", "Folate", "Folic acid"]),
+    ("vitamin_d", "Vitamin D", ["Vitamina D", "25 OH Vitamina D", "Vitamina D 25 OH", "Vitamin D", "25-OH Vitamin D"]),
+    ("tsh", "TSH", ["TSH", "Tirotropina", "Thyrotropin"]),
+    ("free_t4", "Free T4", ["T4 Libre", "T4L", "Tiroxina libre", "Free T4", "FT4"]),
+    ("free_t3", "Free T3", ["T3 Libre", "T3L", "Free T3", "FT3"]),
+    ("total_cholesterol", "Total cholesterol", ["Colesterol Total", "Colesterol", "Total cholesterol", "Cholesterol",
+                                                "Cholesterol, total"]),
+    ("ldl", "LDL cholesterol", ["LDL", "Colesterol LDL", "LDL Colesterol", "LDL cholesterol", "LDL-C"]),
+    ("hdl", "HDL cholesterol", ["HDL", "Colesterol HDL", "HDL Colesterol", "HDL cholesterol", "HDL-C"]),
+    ("triglycerides", "Triglycerides", ["Trigliceridos", "Triglycerides", "TG"]),
+    ("crp", "C-reactive protein", ["PCR", "Proteina C reactiva", "C-reactive protein", "CRP"]),
+    ("esr", "Erythrocyte sedimentation rate", ["VSG", "Eritrosedimentacion", "ESR"]),
+    ("ast", "AST", ["AST", "GOT", "AST (GOT)", "TGO", "Aspartato aminotransferasa"]),
+    ("alt", "ALT", ["ALT", "GPT", "ALT (GPT)", "TGP", "Alanina aminotransferasa"]),
+    ("ggt", "GGT", ["GGT", "Gamma GT", "Gamma glutamil transferasa"]),
+    ("alkaline_phosphatase", "Alkaline phosphatase", ["Fosfatasa alcalina", "FAL", "ALP", "Alkaline phosphatase"]),
+    ("total_bilirubin", "Total bilirubin", ["Bilirrubina total", "Total bilirubin", "Bilirubin, total"]),
+    ("albumin", "Albumin", ["Albumina", "Albumin"]),
+    ("total_protein", "Total protein", ["Proteinas totales", "Total protein"]),
+    ("psa", "PSA", ["PSA", "PSA total", "Antigeno prostatico especifico"]),
+]
+
+NOMBRES = {id_canonico: nombre for id_canonico, nombre, _ in BIOMARCADORES}
+
+
+def _tabla_normalizacion():
+    # One character in, one character out, so positions in the normalized text are
+    # positions in the original line as well
+    tabla = {}
+    for codigo in range(0x41, 0x250):
+        caracter = chr(codigo)
+        base = unicodedata.normalize("NFKD", caracter)[0].lower()
+        if len(base) == 1 and base != caracter:
+            tabla[codigo] = base
+    return tabla
+
+
+_NORMALIZAR = _tabla_normalizacion()
+_FIN = None
+
+
+def normalizar(texto):
+    # ASCII lines (nearly all of them) take the C fast path; both keep positions unchanged
+    return texto.lower() if texto.isascii() else texto.translate(_NORMALIZAR)
+
+
+class _Trie:
+    """Alias trie walked once per name; whitespace runs in the text collapse to one space."""
+
+    def __init__(self):
+        self._raiz = {}
+
+    def agregar(self, alias, id_canonico):
+        nodo = self._raiz
+        for caracter in " ".join(normalizar(alias).split()):
+            nodo = nodo.setdefault(caracter, {})
+        nodo.setdefault(_FIN, id_canonico)
+
+    def prefijo_mas_largo(self, texto, inicio=0):
+        """Returns (end, id) for the longest alias at texto[inicio:] ending on a word boundary, or None.
+
+        texto must already have gone through normalizar().
+        """
+        nodo = self._raiz
+        mejor = None
+        posicion = inicio
+        largo = len(texto)
+        while posicion < largo:
+            caracter = texto[posicion]
+            if caracter.isspace():
+                caracter = " "
+                siguiente = posicion + 1
+                while siguiente < largo and texto[siguiente].isspace():
+                    siguiente += 1
+            else:
+                siguiente = posicion + 1
+            nodo = nodo.get(caracter)
+            if nodo is None:
+                break
+            posicion = siguiente
+            if _FIN in nodo and (posicion == largo or not texto[posicion].isalnum()):
+                mejor = (posicion, nodo[_FIN])
+        return mejor
+
+
+def _compilar():
+    trie = _Trie()
+    for id_canonico, nombre, alias in BIOMARCADORES:
+        for texto in (nombre, *alias):
+            trie.agregar(texto, id_canonico)
+    return trie
+
+
+_TRIE = _compilar()
+
+
+def buscar_al_inicio(linea):
+    """Longest known biomarker name at the start of linea as (end, id), or None."""
+    return _TRIE.prefijo_mas_largo(normalizar(linea))
+
+
+def canonizar(nombre):
+    """Canonical id for a free-text test name, or None when the whole name is not a known alias."""
+    nombre = nombre.strip()
+    encontrado = _TRIE.prefijo_mas_largo(normalizar(nombre))
+    if encontrado is None or encontrado[0] != len(nombre):
+        return None
+    return encontrado[1]
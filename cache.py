@@ -0,0 +1,189 @@
+import os
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+
+def content_key(digest, version):
+    return f"{version}-{digest}"
+
+
+class ResultCache:
+    def __init__(self, max_items=256, disk_dir=None, disk_max_bytes=256 * 1024 * 1024, ttl=None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # Disk entries in least recently used order with their sizes, and their running
+        # total. The directory is scanned once here; after that sets, reads and evictions
+        # keep both up to date, so a set does not stat every file
+        self._disk_sizes = OrderedDict()
+        self._disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and self._expired(entry):
+                del self._memory[key]
+                entry = None
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        entry = self._disk_get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._memory_set(key, entry)
+        return entry[1]
+
+    def contains(self, key):
+        # Cheap membership test for routing decisions: no stats, no disk read
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry):
+                return True
+        return bool(self.disk_dir) and os.path.exists(self._disk_path(key))
+
+    def set(self, key, value):
+        # Entries are stored as (stored_at, value) so the TTL survives the trip through the disk tier
+        entry = (time.time(), value)
+        with self._lock:
+            self._memory_set(key, entry)
+        self._disk_set(key, entry)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._memory if key.startswith(prefix)]:
+                del self._memory[key]
+        if not self.disk_dir:
+            return
+        with os.scandir(self.disk_dir) as it:
+            paths = [entry.path for entry in it if entry.name.startswith(prefix) and entry.name.endswith('.pkl')]
+        for path in paths:
+            self._disk_remove(path)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'memory_items': len(self._memory),
+                'disk_enabled': bool(self.disk_dir),
+                'disk_bytes': self._disk_bytes
+            }
+
+    def _expired(self, entry):
+        return self.ttl is not None and time.time() - entry[0] > self.ttl
+
+    def _memory_set(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+        if not isinstance(entry, tuple) or len(entry) != 2 or self._expired(entry):
+            self._disk_remove(path)
+            return None
+        try:
+            os.utime(path)
+            # Entries written by another worker sharing the directory join the index here
+            size = os.path.getsize(path)
+        except OSError:
+            return entry
+        with self._lock:
+            self._disk_track(path, size)
+        return entry
+
+    def _disk_set(self, key, entry):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"ERROR: No se pudo escribir en la caché de disco: {e}")
+            return
+        with self._lock:
+            self._disk_track(path, size)
+        self._evict_disk()
+
+    def _scan_disk(self):
+        # Least recently used entries go first (reads refresh the mtime)
+        entries = []
+        with os.scandir(self.disk_dir) as it:
+            for entry in it:
+                if not entry.name.endswith('.pkl'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        with self._lock:
+            for _, size, path in sorted(entries):
+                self._disk_track(path, size)
+        self._evict_disk()
+
+    def _disk_track(self, path, size):
+        # Called with the lock held
+        self._disk_bytes += size - self._disk_sizes.pop(path, 0)
+        self._disk_sizes[path] = size
+
+    def _evict_disk(self):
+        # Least recently used entries leave the index under the lock; their files are
+        # removed after it is released
+        victims = []
+        with self._lock:
+            while self._disk_bytes > self.disk_max_bytes and self._disk_sizes:
+                path, size = self._disk_sizes.popitem(last=False)
+                self._disk_bytes -= size
+                victims.append(path)
+        for path in victims:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _disk_remove(self, path):
+        with self._lock:
+            self._disk_bytes -= self._disk_sizes.pop(path, 0)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
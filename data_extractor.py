@@ -1,63 +1,162 @@
 import re
-import pandas as pd
 from math import inf
 
-def parsear_lineas_a_dataframe(lines):
-    pattern_range = (
-        r"([A-Za-z0-9\s()/.\*]+?)" 
-        r"\s+H?([\d.,]+(?:E\d+)?)"
-        r"\s*([a-zA-Z0-9/%µ.*]*)?"
-        r"\s+([\d.,]+)\s*(?:-|\s)\s*([\d.,]+)"
-    )
-
-    pattern_threshold = (
-        r"([A-Za-z0-9\s()/.\*]+?)" 
-        r"\s*([<>])?\s*([\d.,]+(?:E\d+)?)"
-        r"\s*([a-zA-Z0-9/%µ,^]*\s*m2|[a-zA-Z0-9/%µ,^]*)?"
-        r"\s*([<>])\s*([\d.,]+)"
-    )
-
-    data = []
+import metrics
+from biomarkers import buscar_al_inicio, canonizar
+from resultados import ResultadoLab
+
+# Bump whenever parsing or classification output changes so cached results are invalidated
+PARSER_VERSION = "4"
+
+_NOMBRE = r"([A-Za-z0-9\s()/.\*]+?)"
+
+_COLA_RANGO = (
+    r"\s+H?([\d.,]+(?:E\d+)?)"
+    r"\s*([a-zA-Z0-9/%µ.*]*)?"
+    r"\s+([\d.,]+)\s*(?:-|\s)\s*([\d.,]+)"
+)
+
+_COLA_UMBRAL = (
+    r"\s*([<>])?\s*([\d.,]+(?:E\d+)?)"
+    # '.' because _LIMPIEZA has already turned the comma of "mL/min/1,73 m2" into a dot
+    r"\s*([a-zA-Z0-9/%µ,.^]*\s*m2|[a-zA-Z0-9/%µ,^]*)?"
+    r"\s*([<>])\s*([\d.,]+)"
+)
+
+_RANGO = _NOMBRE + _COLA_RANGO
+_UMBRAL = _NOMBRE + _COLA_UMBRAL
+
+# Lines without '<' or '>' can never match a threshold, so they only pay for the range
+# pattern; the rest go through one alternation scanned once (groups 1-5 range, 6-11 threshold)
+_PATRON_RANGO = re.compile(_RANGO)
+_PATRON_COMBINADO = re.compile(f"{_RANGO}|{_UMBRAL}")
+# When a line starts with a known biomarker name the value part is matched right after it,
+# skipping the lazy name group and its backtracking (groups 1-4 range, 5-9 threshold)
+_PATRON_COLA = re.compile(f"(?:{_COLA_RANGO}|{_COLA_UMBRAL})\\s*$")
+_PATRON_DIGITO = re.compile(r"\d")
+_LIMPIEZA = str.maketrans({",": ".", "[": None, "]": None, "*": None})
+# The table keeps its original five columns; canonical ids are on ResultadoLab.test_id
+_COLUMNAS = ["Test", "Value", "Unit", "Ref Low", "Ref High"]
+
+def _resultado(test, test_id, value, unit, ref_low, ref_high):
+    return (test, float(value), unit if unit else "", float(ref_low), float(ref_high), test_id)
+
+def _resultado_umbral(test, test_id, value, unit, sign_ref, limit):
+    limit = float(limit)
+    ref_low, ref_high = (0.0, limit) if sign_ref == "<" else (limit, inf)
+    return (test, float(value), unit if unit else "", ref_low, ref_high, test_id)
+
+def _resultado_desde_match(match):
+    if match.group(2) is not None:
+        test = match.group(1).strip()
+        return _resultado(test, canonizar(test), *match.group(2, 3, 4, 5))
+
+    test = match.group(6).strip()
+    return _resultado_umbral(test, canonizar(test), *match.group(8, 9, 10, 11))
+
+def _resultado_anclado(line):
+    encontrado = buscar_al_inicio(line)
+    if encontrado is None:
+        return None
+    fin, test_id = encontrado
+    match = _PATRON_COLA.match(line, fin)
+    if match is None:
+        return None
+
+    test = line[:fin].strip()
+    if match.group(1) is not None:
+        return _resultado(test, test_id, *match.group(1, 2, 3, 4))
+    return _resultado_umbral(test, test_id, *match.group(6, 7, 8, 9))
+
+def iterar_resultados(lines):
     for line in lines:
         line = line.strip()
-        if not line or line.startswith(("Page", "Página")) or not any(c.isdigit() for c in line):
+        if not line or line.startswith(("Page", "Página")) or _PATRON_DIGITO.search(line) is None:
             continue
-        
-        line = line.replace(",", ".").replace("[", "").replace("]", "").replace("*", "")
 
-        for match in re.finditer(pattern_range, line):
-            test, value, unit, ref_low, ref_high = match.groups()
-            if not value: continue
-            data.append([test.strip(), float(value), unit if unit else "", float(ref_low), float(ref_high)])
+        line = line.translate(_LIMPIEZA)
+        try:
+            resultado = _resultado_anclado(line)
+        except ValueError:
+            resultado = None
+        if resultado is not None:
+            yield resultado
+            continue
+
+        patron = _PATRON_COMBINADO if ("<" in line or ">" in line) else _PATRON_RANGO
+        for match in patron.finditer(line):
+            try:
+                yield _resultado_desde_match(match)
+            except ValueError:
+                # Malformed numbers such as "1.234.5" are skipped instead of failing the whole report
+                continue
+
+def parsear_lineas(lines):
+    with metrics.stage("parse"):
+        return [
+            ResultadoLab(test, value, unit, ref_low, ref_high, test_id=test_id)
+            for test, value, unit, ref_low, ref_high, test_id in iterar_resultados(lines)
+        ]
+
+def parsear_lineas_a_dataframe(lines):
+    import pandas as pd
+
+    with metrics.stage("parse"):
+        return pd.DataFrame([fila[:5] for fila in iterar_resultados(lines)], columns=_COLUMNAS)
+
+def parsear_paginas_a_dataframe(paginas):
+    # Same table as parsear_lineas_a_dataframe, fed page by page (e.g. from iterar_paginas)
+    # so only the current page's lines are held while the rows accumulate
+    import pandas as pd
 
-        for match in re.finditer(pattern_threshold, line):
-            test, sign_val, value, unit, sign_ref, limit = match.groups()
-            if not value or not limit: continue 
+    lineas = (linea for lineas_pagina in paginas for linea in lineas_pagina)
+    with metrics.stage("parse"):
+        return pd.DataFrame([fila[:5] for fila in iterar_resultados(lineas)], columns=_COLUMNAS)
 
-            value = float(value) if value else None
-            limit = float(limit) if limit else None
+def parsear_paginas(paginas):
+    for lineas in paginas:
+        yield parsear_lineas(lineas)
 
-            ref_low, ref_high = (0.0, limit) if sign_ref == "<" else (limit, inf)
-            
-            data.append([test.strip(), value, unit if unit else "", ref_low, ref_high])
+def clasificar(resultados):
+    # Same vectorized rules as clasificar_resultados, fed from plain arrays instead of a DataFrame
+    if not resultados:
+        return resultados
 
-    return pd.DataFrame(data, columns=["Test", "Value", "Unit", "Ref Low", "Ref High"])
+    import numpy as np
+
+    with metrics.stage("classify"):
+        n = len(resultados)
+        value = np.fromiter((r.value for r in resultados), dtype=float, count=n)
+        ref_low = np.fromiter((r.ref_low for r in resultados), dtype=float, count=n)
+        ref_high = np.fromiter((r.ref_high for r in resultados), dtype=float, count=n)
+        for resultado, estado in zip(resultados, _estados(value, ref_low, ref_high).tolist()):
+            resultado.status = estado
+    return resultados
 
 def clasificar_resultados(df):
     if df.empty:
         return df
-        
-    df["Status"] = df.apply(
-        lambda row: ("Normal" if row["Ref Low"] <= row["Value"] <= row["Ref High"] else ("Near"
-            if ((row["Ref High"] == inf and row["Ref Low"] > 0 and abs(row["Value"] - row["Ref Low"]) <= 0.25 * row["Ref Low"])
-                or (row["Ref Low"] == -inf and row["Ref High"] > 0 and abs(row["Value"] - row["Ref High"]) <= 0.25 * row["Ref High"])
-                or (row["Ref High"] != inf and row["Ref Low"] != -inf and (row["Ref High"] - row["Ref Low"]) > 0
-                    and abs(row["Value"] - max(min(row["Value"], row["Ref High"]), row["Ref Low"])) <= 0.25 * (row["Ref High"] - row["Ref Low"])
-                )
-            )
-            else ("Low" if row["Value"] < row["Ref Low"] else "High")
+
+    with metrics.stage("classify"):
+        df["Status"] = _estados(
+            df["Value"].to_numpy(dtype=float),
+            df["Ref Low"].to_numpy(dtype=float),
+            df["Ref High"].to_numpy(dtype=float)
+        )
+    return df
+
+def _estados(value, ref_low, ref_high):
+    import numpy as np
+
+    with np.errstate(invalid="ignore"):
+        width = ref_high - ref_low
+        normal = (ref_low <= value) & (value <= ref_high)
+        near = (
+            ((ref_high == inf) & (ref_low > 0) & (np.abs(value - ref_low) <= 0.25 * ref_low))
+            | ((ref_low == -inf) & (ref_high > 0) & (np.abs(value - ref_high) <= 0.25 * ref_high))
+            | ((ref_high != inf) & (ref_low != -inf) & (width > 0)
+                & (np.abs(value - np.maximum(np.minimum(value, ref_high), ref_low)) <= 0.25 * width))
         )
-    ),
-    axis=1,
-    )
-    return df
\ No newline at end of file
+        low = value < ref_low
+
+    return np.select([normal, near, low], ["Normal", "Near", "Low"], default="High")
\ No newline at end of file
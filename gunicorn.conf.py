@@ -0,0 +1,66 @@
+# Picked up automatically by `gunicorn app:app` when started from this directory.
+# Command-line flags still override anything set here.
+import os
+import random
+import sys
+
+# Import app.py once in the master so workers are forked with it already loaded
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# The admission lanes in app.py queue and reject requests per process, which only
+# happens when a worker serves several requests at once. Each thread is one request,
+# so keep the count above the lanes' in-flight plus queue limits (94 with the defaults);
+# otherwise requests wait in the listen backlog instead of getting 429 + Retry-After
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 128))
+
+# Warm up pandas, pdfplumber, reportlab, the Gemini client etc. in the master as well
+_WARMUP = os.environ.get('GUNICORN_WARMUP', '1') == '1'
+
+
+def on_starting(server):
+    # With METRICS_DIR set, files left there by a previous run would be added to this one
+    import metrics
+    metrics.clear_directory()
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before the first worker is forked
+    if _WARMUP:
+        from warmup import precalentar
+        tiempos = precalentar(congelar=True)
+        server.log.info("Warm-up done in %.3fs", sum(tiempos.values()))
+    _check_threads(server)
+
+
+def _check_threads(server):
+    # Only when the app was preloaded; the master never imports it otherwise
+    app = sys.modules.get('app')
+    # Async worker classes are not bounded by threads
+    if app is None or server.cfg.worker_class_str not in ('sync', 'gthread'):
+        return
+    plazas = sum(lane.max_in_flight + lane.max_queue for lane in app.admission_lanes.values())
+    if server.cfg.threads <= plazas:
+        server.log.warning(
+            "%d threads per worker but the admission lanes hold up to %d requests; "
+            "raise GUNICORN_THREADS or lower the *_MAX_IN_FLIGHT / *_MAX_QUEUE limits",
+            server.cfg.threads, plazas)
+
+
+def post_fork(server, worker):
+    # Forked workers inherit the master's random state; without a reseed every worker
+    # would draw the same retry jitter
+    random.seed()
+    # Each worker writes its own metrics to METRICS_DIR (a no-op when it is not set)
+    import metrics
+    metrics.start_writer()
+
+
+def worker_exit(server, worker):
+    import metrics
+    metrics.write_snapshot()
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.mark_process_dead(worker.pid)
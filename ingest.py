@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+MediLab Analytics - Bulk ingestion
+Parses a directory of historical lab PDFs offline, without going through the API.
+
+    python ingest.py reports/ --out ingested/ --workers 8
+
+Every PDF runs through the same extraction, parsing and classification as
+/api/analyze, on a process pool. Rows are written in shards (Parquet when pyarrow
+or fastparquet is installed, CSV otherwise) and every shard is recorded in
+manifest.jsonl in the output directory. A file only counts as done once the shard
+holding its rows is on disk and listed in the manifest, so running the same command
+again after an interruption skips finished files and carries on with the rest.
+A file whose size or modification time changed is ingested again into a new shard;
+the manifest then lists it twice and the later entry is the current one. Files that
+fail or yield no rows are listed with an error, make the exit status non-zero and are
+processed again with --retry-failed.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import importlib.util
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from pipeline import analizar_pdf, CACHE_VERSION, MAX_WORKERS
+
+PARQUET_DISPONIBLE = any(importlib.util.find_spec(motor) is not None for motor in ('pyarrow', 'fastparquet'))
+
+MANIFIESTO = 'manifest.jsonl'
+COLUMNAS = ['source_file', 'test', 'test_id', 'value', 'unit', 'ref_low', 'ref_high', 'status']
+
+
+def buscar_pdfs(directorio):
+    """Every PDF under directorio, as paths relative to it, in a stable order."""
+    raiz = Path(directorio)
+    return sorted(
+        ruta.relative_to(raiz).as_posix()
+        for ruta in raiz.rglob('*')
+        if ruta.is_file() and ruta.suffix.lower() == '.pdf'
+    )
+
+
+def _firma(ruta):
+    # A file that changed since it was ingested (same name, new content) is processed again
+    estado = os.stat(ruta)
+    return [estado.st_size, estado.st_mtime_ns]
+
+
+def leer_manifiesto(salida):
+    """Returns ({relative path: entry}, next shard number) from an existing manifest."""
+    procesados = {}
+    siguiente = 0
+    ruta = Path(salida) / MANIFIESTO
+    if not ruta.exists():
+        return procesados, siguiente
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            try:
+                entrada = json.loads(linea)
+            except ValueError:
+                # A line cut short by a crash; its shard is rewritten on this run
+                continue
+            siguiente = max(siguiente, entrada['shard_index'] + 1)
+            for archivo in entrada['files']:
+                procesados[archivo['path']] = archivo
+    return procesados, siguiente
+
+
+def procesar_archivo(directorio, relativa):
+    # Runs in the pool: returns plain rows so only tuples cross the process boundary
+    inicio = time.perf_counter()
+    ruta = os.path.join(directorio, relativa)
+    firma = _firma(ruta)
+    try:
+        resultados = analizar_pdf(ruta)
+    except Exception as e:
+        return relativa, firma, [], f"{type(e).__name__}: {e}", time.perf_counter() - inicio
+    if not resultados:
+        # analizar_pdf logs extraction failures and returns no rows, so a corrupt or
+        # unreadable PDF only shows up here; it is reported like /api/analyze does
+        return relativa, firma, [], 'No data could be extracted from this PDF.', time.perf_counter() - inicio
+    filas = [
+        (relativa, r.test, r.test_id, r.value, r.unit, r.ref_low, r.ref_high, r.status)
+        for r in resultados
+    ]
+    return relativa, firma, filas, None, time.perf_counter() - inicio
+
+
+class EscritorShards:
+    """Buffers finished files and writes them out as numbered shards plus a manifest line."""
+
+    def __init__(self, salida, formato, filas_por_shard, siguiente_shard):
+        self.salida = Path(salida)
+        self.formato = formato
+        self.filas_por_shard = filas_por_shard
+        self.siguiente = siguiente_shard
+        self.filas = []
+        self.archivos = []
+        self.shards_escritos = 0
+
+    def agregar(self, relativa, firma, filas, error, segundos):
+        self.filas.extend(filas)
+        entrada = {'path': relativa, 'signature': firma, 'rows': len(filas), 'seconds': round(segundos, 4)}
+        if error:
+            entrada['error'] = error
+        self.archivos.append(entrada)
+        if len(self.filas) >= self.filas_por_shard:
+            self.volcar()
+
+    def volcar(self):
+        if not self.archivos:
+            return
+        import pandas as pd
+
+        nombre = None
+        if self.filas:
+            nombre = f"part-{self.siguiente:05d}.{'parquet' if self.formato == 'parquet' else 'csv'}"
+            df = pd.DataFrame(self.filas, columns=COLUMNAS)
+            temporal = self.salida / (nombre + '.tmp')
+            if self.formato == 'parquet':
+                df.to_parquet(temporal, index=False)
+            else:
+                df.to_csv(temporal, index=False)
+            # The shard is complete on disk before the manifest mentions it
+            os.replace(temporal, self.salida / nombre)
+
+        entrada = {
+            'shard_index': self.siguiente,
+            'shard': nombre,
+            'rows': len(self.filas),
+            'parser_version': CACHE_VERSION,
+            'files': self.archivos,
+        }
+        with open(self.salida / MANIFIESTO, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entrada) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.siguiente += 1
+        self.shards_escritos += 1
+        self.filas = []
+        self.archivos = []
+
+
+class Progreso:
+    def __init__(self, total, intervalo):
+        self.total = total
+        self.intervalo = intervalo
+        self.inicio = time.perf_counter()
+        self.ultimo = self.inicio
+        self.archivos = 0
+        self.filas = 0
+        self.errores = 0
+
+    def registrar(self, filas, error):
+        self.archivos += 1
+        self.filas += filas
+        self.errores += bool(error)
+        ahora = time.perf_counter()
+        if ahora - self.ultimo >= self.intervalo:
+            self.ultimo = ahora
+            print(self.linea(), flush=True)
+
+    def resumen(self):
+        segundos = time.perf_counter() - self.inicio
+        return {
+            'files': self.archivos,
+            'rows': self.filas,
+            'errors': self.errores,
+            'seconds': round(segundos, 3),
+            'files_per_second': round(self.archivos / segundos, 2) if segundos else 0.0,
+            'rows_per_second': round(self.filas / segundos, 1) if segundos else 0.0,
+        }
+
+    def linea(self):
+        datos = self.resumen()
+        return (f"📄 {datos['files']}/{self.total} files, {datos['rows']} rows, {datos['errors']} errors "
+                f"| {datos['files_per_second']} files/s, {datos['rows_per_second']} rows/s")
+
+
+def ingerir(directorio, salida, formato, workers, filas_por_shard, reintentar_fallidos=False, intervalo=5.0):
+    Path(salida).mkdir(parents=True, exist_ok=True)
+    procesados, siguiente_shard = leer_manifiesto(salida)
+
+    pendientes = []
+    for relativa in buscar_pdfs(directorio):
+        previo = procesados.get(relativa)
+        if previo is not None and previo['signature'] == _firma(os.path.join(directorio, relativa)):
+            if not (reintentar_fallidos and previo.get('error')):
+                continue
+        pendientes.append(relativa)
+
+    print(f"🏥 {len(pendientes)} PDFs to ingest ({len(procesados)} already in the manifest), "
+          f"{workers} workers, {formato} shards")
+
+    escritor = EscritorShards(salida, formato, filas_por_shard, siguiente_shard)
+    progreso = Progreso(len(pendientes), intervalo)
+    # Only a few files per worker are submitted at a time, so a directory with thousands
+    # of PDFs does not queue thousands of futures (and their results) in this process
+    limite = workers * 4
+    restantes = iter(pendientes)
+    en_curso = set()
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            for relativa in restantes:
+                en_curso.add(pool.submit(procesar_archivo, directorio, relativa))
+                if len(en_curso) >= limite:
+                    break
+            if not en_curso:
+                break
+            terminados, en_curso = wait(en_curso, return_when=FIRST_COMPLETED)
+            for future in terminados:
+                relativa, firma, filas, error, segundos = future.result()
+                if error:
+                    print(f"❌ {relativa}: {error}")
+                escritor.agregar(relativa, firma, filas, error, segundos)
+                progreso.registrar(len(filas), error)
+    finally:
+        # Also on Ctrl+C: files that have already finished are kept, the rest are redone next run
+        pool.shutdown(wait=True, cancel_futures=True)
+        escritor.volcar()
+
+    resumen = progreso.resumen()
+    resumen['shards_written'] = escritor.shards_escritos
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a directory of lab PDFs into Parquet/CSV shards")
+    parser.add_argument('input', help="directory searched recursively for .pdf files")
+    parser.add_argument('--out', required=True, help="output directory for the shards and manifest.jsonl")
+    parser.add_argument('--format', choices=['parquet', 'csv'],
+                        default='parquet' if PARQUET_DISPONIBLE else 'csv')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--shard-rows', type=int, default=50000, help="rows buffered before a shard is written")
+    parser.add_argument('--retry-failed', action='store_true', help="process again files that failed before")
+    parser.add_argument('--progress-every', type=float, default=5.0, help="seconds between progress lines")
+    parser.add_argument('--stats', help="write the throughput summary as JSON to this file")
+    args = parser.parse_args()
+
+    if args.format == 'parquet' and not PARQUET_DISPONIBLE:
+        parser.error("Parquet output needs pyarrow or fastparquet (pip install pyarrow); use --format csv")
+    if not os.path.isdir(args.input):
+        parser.error(f"{args.input} is not a directory")
+
+    try:
+        resumen = ingerir(args.input, args.out, args.format, max(1, args.workers), max(1, args.shard_rows),
+                          args.retry_failed, args.progress_every)
+    except KeyboardInterrupt:
+        print("\n👋 Interrupted; run the same command again to resume")
+        return 130
+
+    print(f"✅ {resumen['files']} files, {resumen['rows']} rows, {resumen['errors']} errors in "
+          f"{resumen['seconds']}s ({resumen['files_per_second']} files/s, {resumen['rows_per_second']} rows/s), "
+          f"{resumen['shards_written']} shards written")
+    if args.stats:
+        with open(args.stats, 'w') as f:
+            f.write(json.dumps(resumen, indent=2))
+    return 1 if resumen['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
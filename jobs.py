@@ -0,0 +1,191 @@
+import os
+import json
+import stat
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def _directorio_privado(path):
+    """Creates path readable only by this user, or checks an existing one is.
+
+    Job files hold patients' results and reports. A directory under a shared temp dir
+    could have been created beforehand by another user, who could then read or replace
+    them, so one owned by someone else is refused and a group/world accessible one is
+    tightened to 0700.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if hasattr(os, 'geteuid') and info.st_uid != os.geteuid():
+        raise PermissionError(f"{path} belongs to another user; set REPORT_JOBS_DIR to a private directory")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+class Job:
+    def __init__(self, job_id, report_type):
+        self.id = job_id
+        self.report_type = report_type
+        self.status = 'queued'
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'type': self.report_type,
+            'status': self.status,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+        if self.error:
+            data['error'] = self.error
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data['job_id'], data['type'])
+        job.status = data['status']
+        job.error = data.get('error')
+        job.created_at = data['created_at']
+        job.finished_at = data['finished_at']
+        return job
+
+
+class JobQueue:
+    """Report jobs run on a thread pool in the worker that accepted them.
+
+    Their state and finished PDFs are kept as files in state_dir, so with several
+    gunicorn workers any of them can answer the status and download requests. Every
+    worker must be given the same directory (on one host, the default temp directory).
+    """
+    # run_job(report_type, results) must return the finished PDF as bytes; passing a
+    # different callable lets tests and load runs swap the LLM for an in-process stand-in
+    def __init__(self, run_job, state_dir, max_workers=4, result_ttl=900, max_pending=100):
+        self.run_job = run_job
+        self.state_dir = state_dir
+        self.result_ttl = result_ttl
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='report-job')
+        self._lock = threading.Lock()
+        _directorio_privado(state_dir)
+
+    def submit(self, report_type, results):
+        with self._lock:
+            jobs = self._evict_expired()
+            pending = sum(1 for job in jobs if job.status in ('queued', 'running'))
+            if pending >= self.max_pending:
+                raise QueueFullError('Too many report jobs in progress')
+            job = Job(uuid.uuid4().hex, report_type)
+            self._save(job)
+        self._executor.submit(self._run, job, results)
+        return job
+
+    def add_finished(self, report_type, result):
+        # Stores a PDF produced outside the pool (e.g. by the streaming endpoint) so it can be downloaded later
+        job = Job(uuid.uuid4().hex, report_type)
+        job.status = 'done'
+        job.finished_at = time.time()
+        with self._lock:
+            self._evict_expired()
+            self._finish(job, result)
+        return job
+
+    def get(self, job_id):
+        if not job_id.isalnum():
+            return None
+        job = self._load(self._path(job_id, 'json'))
+        if job is None or self._expired(job, time.time()):
+            return None
+        return job
+
+    def read_result(self, job):
+        try:
+            with open(self._path(job.id, 'pdf'), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def stats(self):
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        now = time.time()
+        for job in self._jobs():
+            if not self._expired(job, now):
+                counts[job.status] += 1
+        return counts
+
+    def _run(self, job, results):
+        job.status = 'running'
+        self._save(job)
+        try:
+            result = self.run_job(job.report_type, results)
+        except Exception as e:
+            logger.exception("¡FALLO AL GENERAR PDF! Job %s", job.id)
+            job.error = str(e)
+            job.status = 'failed'
+            job.finished_at = time.time()
+            self._save(job)
+            return
+        job.status = 'done'
+        job.finished_at = time.time()
+        self._finish(job, result)
+
+    def _path(self, job_id, extension):
+        return os.path.join(self.state_dir, f"{job_id}.{extension}")
+
+    def _write(self, path, data):
+        # Written to a temporary name and renamed, so other workers never read half a file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _save(self, job):
+        self._write(self._path(job.id, 'json'), json.dumps(job.to_dict()).encode('utf-8'))
+
+    def _finish(self, job, result):
+        # The PDF is in place before the state says 'done'
+        self._write(self._path(job.id, 'pdf'), result)
+        self._save(job)
+
+    def _load(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return Job.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _jobs(self):
+        with os.scandir(self.state_dir) as it:
+            paths = [entry.path for entry in it if entry.name.endswith('.json')]
+        return [job for job in map(self._load, paths) if job is not None]
+
+    def _expired(self, job, now):
+        # Jobs left queued or running by a worker that exited are dropped after the same TTL
+        reference = job.finished_at if job.finished_at is not None else job.created_at
+        return now - reference > self.result_ttl
+
+    def _evict_expired(self):
+        # Returns the jobs that are still live
+        now = time.time()
+        live = []
+        for job in self._jobs():
+            if not self._expired(job, now):
+                live.append(job)
+                continue
+            for extension in ('json', 'pdf'):
+                try:
+                    os.remove(self._path(job.id, extension))
+                except OSError:
+                    pass
+        return live
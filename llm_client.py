@@ -0,0 +1,204 @@
+import os
+import sys
+import time
+import random
+import hashlib
+import logging
+import threading
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini")
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 60))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 3))
+LLM_STUB_LATENCY = float(os.environ.get("LLM_STUB_LATENCY_MS", 0)) / 1000
+
+_CODIGOS_TRANSITORIOS = {408, 429, 500, 502, 503, 504}
+
+
+def _genai():
+    import google.genai as genai
+    from google.genai import types as genai_types
+    return genai, genai_types
+
+
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self, model=GEMINI_MODEL, timeout=LLM_TIMEOUT):
+        self.model_name = model
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        # One client per process so the underlying HTTP connection pool is reused between reports
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    api_key = os.getenv("GEMINI_API_KEY")
+                    if not api_key:
+                        raise ValueError("No se encontró la GEMINI_API_KEY.")
+                    genai, genai_types = _genai()
+                    self._client = genai.Client(
+                        api_key=api_key,
+                        http_options=genai_types.HttpOptions(timeout=int(self.timeout * 1000))
+                    )
+        return self._client
+
+    def generate(self, prompt):
+        response = self.client().models.generate_content(model=self.model_name, contents=prompt)
+        return response.text
+
+    def generate_stream(self, prompt):
+        for chunk in self.client().models.generate_content_stream(model=self.model_name, contents=prompt):
+            if chunk.text:
+                yield chunk.text
+
+
+class StubBackend:
+    # Deterministic, network-free stand-in for load tests and CI
+    name = "stub"
+
+    def __init__(self, latency=LLM_STUB_LATENCY):
+        self.model_name = "stub"
+        self.latency = latency
+
+    def generate(self, prompt):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._texto(prompt)
+
+    def generate_stream(self, prompt):
+        # Same text as generate(), delivered in paragraph-sized chunks with the latency spread across them
+        bloques = self._texto(prompt).split("\n\n")
+        for index, bloque in enumerate(bloques):
+            if self.latency:
+                time.sleep(self.latency / len(bloques))
+            yield bloque if index == len(bloques) - 1 else bloque + "\n\n"
+
+    def _texto(self, prompt):
+        resultados = [linea for linea in prompt.splitlines() if "Status:" in linea]
+        fuera_de_rango = [
+            linea.split(":", 1)[0] for linea in resultados
+            if not linea.rstrip(". ").endswith("Normal")
+        ]
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        resumen = ", ".join(fuera_de_rango) if fuera_de_rango else "none"
+        return (
+            f"Automated summary {digest}.\n\n"
+            f"{len(resultados)} results were reviewed and {len(resultados) - len(fuera_de_rango)} are within range.\n\n"
+            f"Results that need attention: {resumen}.\n\n"
+            "This report is for informational purposes only and does not replace professional medical evaluation."
+        )
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "stub": StubBackend,
+}
+
+
+def es_error_transitorio(error):
+    # Looked up in sys.modules: if google.genai or httpx were never imported, the error
+    # cannot come from them and there is no reason to import them here
+    genai_errors = sys.modules.get("google.genai.errors")
+    if genai_errors is not None and isinstance(error, genai_errors.APIError):
+        return error.code in _CODIGOS_TRANSITORIOS
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, TimeoutError)
+
+
+class LLMClient:
+    def __init__(self, backend, max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, backoff_base=0.5, backoff_max=8.0):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+    @property
+    def model_name(self):
+        return self.backend.model_name
+
+    def generate(self, prompt):
+        return self._with_retries(self.backend.generate, prompt)
+
+    def generate_stream(self, prompt):
+        # Retries are only possible until the first chunk has been handed to the caller
+        intento = 0
+        while True:
+            if not self._semaphore.acquire(timeout=self.timeout):
+                raise TimeoutError("Too many concurrent LLM requests")
+            emitido = False
+            try:
+                for chunk in self.backend.generate_stream(prompt):
+                    emitido = True
+                    yield chunk
+                return
+            except Exception as e:
+                self._registrar_error(e)
+                if emitido or intento >= self.max_retries or not es_error_transitorio(e):
+                    raise
+                error = e
+            finally:
+                self._semaphore.release()
+
+            intento += 1
+            self._esperar(intento, error)
+
+    def _with_retries(self, call, *args):
+        intento = 0
+        while True:
+            if not self._semaphore.acquire(timeout=self.timeout):
+                raise TimeoutError("Too many concurrent LLM requests")
+            try:
+                return call(*args)
+            except Exception as e:
+                self._registrar_error(e)
+                if intento >= self.max_retries or not es_error_transitorio(e):
+                    raise
+                error = e
+            finally:
+                self._semaphore.release()
+
+            intento += 1
+            self._esperar(intento, error)
+
+    def _registrar_error(self, error):
+        tipo = "transient" if es_error_transitorio(error) else "fatal"
+        metrics.count(metrics.UPSTREAM_ERRORS, (getattr(self.backend, "name", "unknown"), tipo))
+
+    def _esperar(self, intento, error):
+        # Full jitter: spreads retries from concurrent workers instead of retrying in lockstep
+        espera = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (intento - 1)))
+        logger.warning("Error transitorio del LLM (%s), reintento %d en %.2fs", error, intento, espera)
+        time.sleep(espera)
+
+
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def obtener_llm():
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                _llm = LLMClient(BACKENDS[LLM_BACKEND]())
+    return _llm
+
+
+def configurar_llm(backend):
+    global _llm
+    with _llm_lock:
+        _llm = LLMClient(backend)
+    return _llm
@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; covers everything from regex parsing of one page to a slow Gemini round trip
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_METRICS = {}
+_CALLBACKS = []
+_local = threading.local()
+
+# Every gunicorn worker has its own registry. When METRICS_DIR is set, each worker
+# writes its series there as <pid>.json (every METRICS_WRITE_INTERVAL seconds and when
+# it serves /metrics), and /metrics adds up the files of all workers
+METRICS_DIR = os.environ.get("METRICS_DIR")
+WRITE_INTERVAL = float(os.environ.get("METRICS_WRITE_INTERVAL", 5))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _METRICS[name] = self
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def series(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _METRICS[name] = self
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            serie = self._series.get(labels)
+            if serie is None:
+                serie = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][index] += 1
+            serie[1] += value
+            serie[2] += 1
+
+    def series(self):
+        # [labels, [count per bucket, +Inf], sum, count]; the buckets are not cumulative here
+        with self._lock:
+            return [[list(labels), list(serie[0]), serie[1], serie[2]] for labels, serie in self._series.items()]
+
+
+def register_callback(callback, shared=False):
+    # callback() returns [(name, type, help, [(labels dict, value), ...]), ...] evaluated at scrape time.
+    # shared=True for values that already cover every worker (e.g. state on disk), which
+    # are then reported once instead of added up across workers
+    _CALLBACKS.append((callback, shared))
+
+
+def _familia(name, tipo, help_text, labels, series, buckets=None):
+    familia = {"name": name, "type": tipo, "help": help_text, "labels": list(labels), "series": series}
+    if buckets is not None:
+        familia["buckets"] = list(buckets)
+    return familia
+
+
+def _familias_callbacks(shared):
+    familias = []
+    for callback, compartido in _CALLBACKS:
+        if compartido != shared:
+            continue
+        for name, tipo, help_text, samples in callback():
+            nombres = list(samples[0][0]) if samples else []
+            familias.append(_familia(name, tipo, help_text, nombres, [[list(labels.values()), value] for labels, value in samples]))
+    return familias
+
+
+def snapshot():
+    """Every series of this process, without the shared callbacks, as JSON-friendly dicts."""
+    familias = [
+        _familia(metric.name, metric.type, metric.help, metric.labels, metric.series(), getattr(metric, "buckets", None))
+        for metric in _METRICS.values()
+    ]
+    return familias + _familias_callbacks(shared=False)
+
+
+def _ruta_proceso(directorio, pid):
+    return os.path.join(directorio, f"{pid}.json")
+
+
+def write_snapshot(directorio=None):
+    directorio = directorio or METRICS_DIR
+    if not directorio:
+        return
+    ruta = _ruta_proceso(directorio, os.getpid())
+    tmp_path = f"{ruta}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot(), f)
+        os.replace(tmp_path, ruta)
+    except OSError as e:
+        print(f"ERROR: No se pudieron escribir las métricas en {directorio}: {e}")
+
+
+def start_writer(directorio=None):
+    """Writes this process's snapshot every WRITE_INTERVAL seconds from a daemon thread.
+
+    Called in each worker after the fork (gunicorn.conf.py's post_fork).
+    """
+    directorio = directorio or METRICS_DIR
+    if not directorio:
+        return
+    os.makedirs(directorio, exist_ok=True)
+
+    def escribir():
+        while True:
+            time.sleep(WRITE_INTERVAL)
+            write_snapshot(directorio)
+
+    threading.Thread(target=escribir, name="metrics-writer", daemon=True).start()
+
+
+def clear_directory(directorio=None):
+    # Run once in the gunicorn master before the workers start, so files left by a
+    # previous run are not added to the new one
+    directorio = directorio or METRICS_DIR
+    if not directorio:
+        return
+    os.makedirs(directorio, exist_ok=True)
+    with os.scandir(directorio) as it:
+        for entry in it:
+            if entry.name.endswith((".json", ".tmp")):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+def mark_process_dead(pid, directorio=None):
+    # Counters and histograms of an exited worker are kept so the totals never go down;
+    # its gauges no longer describe anything that is running
+    directorio = directorio or METRICS_DIR
+    if not directorio:
+        return
+    ruta = _ruta_proceso(directorio, pid)
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            familias = json.load(f)
+    except (OSError, ValueError):
+        return
+    with open(f"{ruta}.tmp", "w", encoding="utf-8") as f:
+        json.dump([familia for familia in familias if familia["type"] != "gauge"], f)
+    os.replace(f"{ruta}.tmp", ruta)
+
+
+def _leer_directorio(directorio):
+    familias = []
+    with os.scandir(directorio) as it:
+        rutas = [entry.path for entry in it if entry.name.endswith(".json")]
+    for ruta in rutas:
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                familias.extend(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return familias
+
+
+def _sumar(familias):
+    # Same-named series from different processes are added up: counters, gauges and
+    # every bucket, sum and count of the histograms
+    unidas = {}
+    for familia in familias:
+        union = unidas.get(familia["name"])
+        if union is None:
+            union = unidas[familia["name"]] = dict(familia, series={})
+        for serie in familia["series"]:
+            labels = tuple(serie[0])
+            previa = union["series"].get(labels)
+            if previa is None:
+                union["series"][labels] = serie[1:]
+            elif familia["type"] == "histogram":
+                previa[0] = [a + b for a, b in zip(previa[0], serie[1])]
+                previa[1] += serie[2]
+                previa[2] += serie[3]
+            else:
+                previa[0] += serie[1]
+    return [
+        dict(union, series=[[list(labels)] + valores for labels, valores in union["series"].items()])
+        for union in unidas.values()
+    ]
+
+
+def _formatear(familia):
+    lineas = [f"# HELP {familia['name']} {familia['help']}", f"# TYPE {familia['name']} {familia['type']}"]
+    nombres = tuple(familia["labels"])
+    for serie in familia["series"]:
+        labels = tuple(serie[0])
+        if familia["type"] != "histogram":
+            lineas.append(f"{familia['name']}{_format_labels(nombres, labels)} {serie[1]}")
+            continue
+        cuentas, suma, total = serie[1], serie[2], serie[3]
+        acumulado = 0
+        for limite, cuenta in zip(list(familia["buckets"]) + [float("inf")], cuentas):
+            acumulado += cuenta
+            le = "+Inf" if limite == float("inf") else repr(limite)
+            lineas.append(f"{familia['name']}_bucket{_format_labels(nombres + ('le',), labels + (le,))} {acumulado}")
+        lineas.append(f"{familia['name']}_sum{_format_labels(nombres, labels)} {suma}")
+        lineas.append(f"{familia['name']}_count{_format_labels(nombres, labels)} {total}")
+    return lineas
+
+
+def render():
+    if METRICS_DIR:
+        # This worker's file is brought up to date; the others are at most WRITE_INTERVAL old
+        write_snapshot(METRICS_DIR)
+        familias = _sumar(_leer_directorio(METRICS_DIR))
+    else:
+        familias = snapshot()
+    lineas = []
+    for familia in familias + _familias_callbacks(shared=True):
+        lineas.extend(_formatear(familia))
+    return "\n".join(lineas) + "\n"
+
+
+STAGE_SECONDS = Histogram("medilab_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+REQUEST_SECONDS = Histogram("medilab_request_seconds", "Request latency until the response is returned", ["endpoint"])
+REQUESTS = Counter("medilab_requests_total", "HTTP requests by endpoint and status code", ["endpoint", "status"])
+PAGES = Counter("medilab_pdf_pages_total", "PDF pages extracted by backend", ["backend"])
+ROWS = Counter("medilab_result_rows_total", "Classified lab-result rows produced")
+UPSTREAM_ERRORS = Counter("medilab_upstream_errors_total", "Errors returned by upstream LLM calls", ["backend", "kind"])
+PROMPT_TOKENS = Counter("medilab_llm_prompt_tokens_total", "Estimated prompt tokens: a full prompt would need (full) and actually sent (sent)", ["kind"])
+ADMISSION_IN_FLIGHT = Gauge("medilab_admission_in_flight", "Requests holding an admission slot", ["lane"])
+ADMISSION_QUEUED = Gauge("medilab_admission_queued", "Requests waiting for an admission slot", ["lane"])
+ADMISSION_REJECTED = Counter("medilab_admission_rejected_total", "Requests rejected with 429 by admission control", ["lane"])
+ADMISSION_WAIT = Histogram("medilab_admission_wait_seconds", "Time spent waiting for an admission slot", ["lane"])
+
+
+# Work done in a worker process (or a helper thread) is collected here and replayed
+# in the process that serves /metrics; the same data feeds the Server-Timing header.
+
+def _collector():
+    return getattr(_local, "collector", None)
+
+
+@contextmanager
+def collecting():
+    previo = _collector()
+    _local.collector = {"stages": [], "counts": []}
+    try:
+        yield _local.collector
+    finally:
+        _local.collector = previo
+
+
+def start_request():
+    _local.collector = {"stages": [], "counts": []}
+
+
+def end_request():
+    collector = _collector()
+    _local.collector = None
+    return collector
+
+
+def record_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, (name,))
+    collector = _collector()
+    if collector is not None:
+        collector["stages"].append((name, seconds))
+
+
+def count(counter, labels=(), amount=1):
+    counter.inc(labels, amount)
+    collector = _collector()
+    if collector is not None:
+        collector["counts"].append((counter.name, labels, amount))
+
+
+@contextmanager
+def stage(name):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - inicio)
+
+
+def replay(collected):
+    if not collected:
+        return
+    for name, seconds in collected["stages"]:
+        record_stage(name, seconds)
+    for metric_name, labels, amount in collected["counts"]:
+        count(_METRICS[metric_name], labels, amount)
+
+
+def server_timing(collected):
+    totales = {}
+    for name, seconds in (collected or {}).get("stages", []):
+        totales[name] = totales.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totales.items())
@@ -0,0 +1,105 @@
+"""Resultados normalizados por biomarcador
+
+Revision ID: 3f2c9a7d41e6
+Revises: b941a5dc970f
+Create Date: 2026-10-16 10:12:31.512904
+
+"""
+import json
+import math
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2c9a7d41e6'
+down_revision = 'b941a5dc970f'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def _float_or_none(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) or math.isinf(value) else value
+
+
+def _backfill():
+    bind = op.get_bind()
+    timeline = sa.table(
+        'timeline',
+        sa.column('id', sa.Integer),
+        sa.column('date', sa.DateTime),
+        sa.column('results', sa.JSON),
+        sa.column('user_id', sa.Integer),
+    )
+    lab_result = sa.table(
+        'lab_result',
+        sa.column('user_id', sa.Integer),
+        sa.column('timeline_id', sa.Integer),
+        sa.column('test', sa.String),
+        sa.column('date', sa.DateTime),
+        sa.column('value', sa.Float),
+        sa.column('unit', sa.String),
+        sa.column('ref_low', sa.Float),
+        sa.column('ref_high', sa.Float),
+        sa.column('status', sa.String),
+    )
+
+    rows = []
+    query = sa.select(timeline.c.id, timeline.c.date, timeline.c.results, timeline.c.user_id).order_by(timeline.c.id)
+    for timeline_id, date, results, user_id in bind.execute(query):
+        if isinstance(results, str):
+            results = json.loads(results)
+        for result in results or []:
+            if not isinstance(result, dict) or not result.get('test'):
+                continue
+            rows.append({
+                'user_id': user_id,
+                'timeline_id': timeline_id,
+                'test': str(result['test'])[:120],
+                'date': date,
+                'value': _float_or_none(result.get('value')),
+                'unit': result.get('unit') or '',
+                'ref_low': _float_or_none(result.get('refLow')),
+                'ref_high': _float_or_none(result.get('refHigh')),
+                'status': result.get('status'),
+            })
+            if len(rows) >= BATCH_SIZE:
+                op.bulk_insert(lab_result, rows)
+                rows = []
+    if rows:
+        op.bulk_insert(lab_result, rows)
+
+
+def upgrade():
+    op.create_table('lab_result',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('timeline_id', sa.Integer(), nullable=True),
+    sa.Column('test', sa.String(length=120), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('value', sa.Float(), nullable=True),
+    sa.Column('unit', sa.String(length=40), nullable=True),
+    sa.Column('ref_low', sa.Float(), nullable=True),
+    sa.Column('ref_high', sa.Float(), nullable=True),
+    sa.Column('status', sa.String(length=10), nullable=True),
+    sa.ForeignKeyConstraint(['timeline_id'], ['timeline.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_lab_result_user_test_date', 'lab_result', ['user_id', 'test', 'date'], unique=False)
+    op.create_index(op.f('ix_lab_result_timeline_id'), 'lab_result', ['timeline_id'], unique=False)
+
+    _backfill()
+
+
+def downgrade():
+    op.drop_index(op.f('ix_lab_result_timeline_id'), table_name='lab_result')
+    op.drop_index('ix_lab_result_user_test_date', table_name='lab_result')
+    op.drop_table('lab_result')
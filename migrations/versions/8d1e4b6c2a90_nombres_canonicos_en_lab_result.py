@@ -0,0 +1,153 @@
+"""Nombres canónicos en lab_result
+
+Revision ID: 8d1e4b6c2a90
+Revises: 3f2c9a7d41e6
+Create Date: 2026-10-17 00:21:07.318552
+
+"""
+import json
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d1e4b6c2a90'
+down_revision = '3f2c9a7d41e6'
+branch_labels = None
+depends_on = None
+
+# Canonical id -> names, copied from biomarkers.BIOMARCADORES when this revision was written.
+# The migration must give the same result whatever the live table says later on.
+BIOMARCADORES = {
+    'hemoglobin': ['Hemoglobin', 'Hemoglobina', 'Hemoglobin (Hb)', 'Hemoglobina (Hb)', 'Hb', 'HGB'],
+    'hematocrit': ['Hematocrit', 'Hematocrito', 'Hematocrit (Hct)', 'Hto', 'Hct', 'HCT'],
+    'wbc': ['White blood cells', 'Leucocitos', 'Leucocitos totales', 'Globulos blancos',
+            'White Blood Cell Count', 'Leukocytes', 'WBC'],
+    'rbc': ['Red blood cells', 'Hematies', 'Eritrocitos', 'Globulos rojos', 'Red Blood Cell Count',
+            'Erythrocytes', 'RBC'],
+    'platelets': ['Platelets', 'Plaquetas', 'Recuento de plaquetas', 'Platelet count', 'PLT'],
+    'mcv': ['Mean corpuscular volume', 'VCM', 'Volumen corpuscular medio', 'MCV'],
+    'mch': ['Mean corpuscular hemoglobin', 'HCM', 'Hemoglobina corpuscular media', 'MCH'],
+    'mchc': ['Mean corpuscular hemoglobin concentration', 'CHCM', 'MCHC'],
+    'rdw': ['Red cell distribution width', 'ADE', 'RDW', 'RDW-CV'],
+    'glucose': ['Glucose', 'Glucosa', 'Glucosa basal', 'Glucemia', 'Fasting glucose',
+                'Glucose (fasting)'],
+    'hba1c': ['Hemoglobin A1c', 'HbA1c', 'Hemoglobina glicosilada', 'Hemoglobina glicada', 'A1c'],
+    'creatinine': ['Creatinine', 'Creatinina'],
+    'urea': ['Urea', 'Uremia'],
+    'bun': ['Blood urea nitrogen', 'BUN', 'Nitrogeno ureico'],
+    'egfr': ['Estimated GFR', 'eGFR', 'Filtrado glomerular', 'Filtrado glomerular estimado', 'GFR'],
+    'uric_acid': ['Uric acid', 'Acido urico'],
+    'sodium': ['Sodium', 'Sodio', 'Na'],
+    'potassium': ['Potassium', 'Potasio', 'K'],
+    'chloride': ['Chloride', 'Cloro', 'Cloruro', 'Cl'],
+    'calcium': ['Calcium', 'Calcio', 'Calcio total', 'Ca'],
+    'magnesium': ['Magnesium', 'Magnesio', 'Mg'],
+    'phosphorus': ['Phosphorus', 'Fosforo', 'Phosphate'],
+    'iron': ['Iron', 'Hierro', 'Hierro serico', 'Sideremia', 'Serum iron'],
+    'ferritin': ['Ferritin', 'Ferritina'],
+    'transferrin': ['Transferrin', 'Transferrina'],
+    'vitamin_b12': ['Vitamin B12', 'Vitamina B12', 'Cobalamina', 'Cobalamin'],
+    'folate': ['Folate', 'Acido folico', 'Folato', 'Folic acid'],
+    'vitamin_d': ['Vitamin D', 'Vitamina D', '25 OH Vitamina D', 'Vitamina D 25 OH',
+                  '25-OH Vitamin D'],
+    'tsh': ['TSH', 'Tirotropina', 'Thyrotropin'],
+    'free_t4': ['Free T4', 'T4 Libre', 'T4L', 'Tiroxina libre', 'FT4'],
+    'free_t3': ['Free T3', 'T3 Libre', 'T3L', 'FT3'],
+    'total_cholesterol': ['Total cholesterol', 'Colesterol Total', 'Colesterol', 'Cholesterol',
+                          'Cholesterol, total'],
+    'ldl': ['LDL cholesterol', 'LDL', 'Colesterol LDL', 'LDL Colesterol', 'LDL-C'],
+    'hdl': ['HDL cholesterol', 'HDL', 'Colesterol HDL', 'HDL Colesterol', 'HDL-C'],
+    'triglycerides': ['Triglycerides', 'Trigliceridos', 'TG'],
+    'crp': ['C-reactive protein', 'PCR', 'Proteina C reactiva', 'CRP'],
+    'esr': ['Erythrocyte sedimentation rate', 'VSG', 'Eritrosedimentacion', 'ESR'],
+    'ast': ['AST', 'GOT', 'AST (GOT)', 'TGO', 'Aspartato aminotransferasa'],
+    'alt': ['ALT', 'GPT', 'ALT (GPT)', 'TGP', 'Alanina aminotransferasa'],
+    'ggt': ['GGT', 'Gamma GT', 'Gamma glutamil transferasa'],
+    'alkaline_phosphatase': ['Alkaline phosphatase', 'Fosfatasa alcalina', 'FAL', 'ALP'],
+    'total_bilirubin': ['Total bilirubin', 'Bilirrubina total', 'Bilirubin, total'],
+    'albumin': ['Albumin', 'Albumina'],
+    'total_protein': ['Total protein', 'Proteinas totales'],
+    'psa': ['PSA', 'PSA total', 'Antigeno prostatico especifico'],
+}
+
+
+def _normalizar(nombre):
+    # Same matching as biomarkers.canonizar: case and accents ignored, whitespace runs collapsed
+    nombre = "".join(
+        unicodedata.normalize("NFKD", caracter)[0].lower() if "A" <= caracter <= "\u024f" else caracter
+        for caracter in nombre
+    )
+    return " ".join(nombre.split())
+
+
+ALIAS = {_normalizar(nombre): id_canonico for id_canonico, nombres in BIOMARCADORES.items() for nombre in nombres}
+
+
+def _canonizar(nombre):
+    return ALIAS.get(_normalizar(nombre))
+
+
+def _tablas():
+    timeline = sa.table('timeline', sa.column('id', sa.Integer), sa.column('results', sa.JSON))
+    lab_result = sa.table(
+        'lab_result',
+        sa.column('id', sa.Integer),
+        sa.column('timeline_id', sa.Integer),
+        sa.column('test', sa.String),
+    )
+    return timeline, lab_result
+
+
+def upgrade():
+    # The backfill in 3f2c9a7d41e6 copied the names printed by the lab, while new reports
+    # store the canonical biomarker id (unknown names keep their text). Rows are rewritten
+    # once per distinct name so /trend and /analytics see one series per biomarker.
+    bind = op.get_bind()
+    _, lab_result = _tablas()
+
+    nombres = bind.execute(sa.select(lab_result.c.test).distinct()).scalars().all()
+    for nombre in nombres:
+        canonico = _canonizar(nombre)
+        if canonico is None or canonico == nombre:
+            continue
+        bind.execute(
+            sa.update(lab_result).where(lab_result.c.test == nombre).values(test=canonico)
+        )
+
+
+def downgrade():
+    # The printed names are still in timeline.results. Each report's rows were stored in the
+    # order of its results, so they are paired in that order with the entries whose name
+    # maps to the row's id. Rows without a timeline entry have nothing to restore from.
+    bind = op.get_bind()
+    timeline, lab_result = _tablas()
+
+    query = (
+        sa.select(lab_result.c.id, lab_result.c.timeline_id, lab_result.c.test, timeline.c.results)
+        .join(timeline, timeline.c.id == lab_result.c.timeline_id)
+        .where(lab_result.c.test.in_(list(BIOMARCADORES)))
+        .order_by(lab_result.c.timeline_id, lab_result.c.id)
+    )
+    cambios = []
+    timeline_actual = None
+    for fila_id, timeline_id, test, results in bind.execute(query):
+        if timeline_id != timeline_actual:
+            timeline_actual = timeline_id
+            if isinstance(results, str):
+                results = json.loads(results)
+            pendientes = iter([r for r in results or [] if isinstance(r, dict) and r.get('test')])
+        for result in pendientes:
+            if (result.get('testId') or _canonizar(str(result['test']))) == test:
+                nombre = str(result['test'])[:120]
+                if nombre != test:
+                    cambios.append({'fila_id': fila_id, 'nombre': nombre})
+                break
+
+    if cambios:
+        bind.execute(
+            sa.update(lab_result).where(lab_result.c.id == sa.bindparam('fila_id')).values(test=sa.bindparam('nombre')),
+            cambios,
+        )
@@ -0,0 +1,29 @@
+"""Timeline sin reportes duplicados
+
+Revision ID: c5a17e3f9b28
+Revises: 8d1e4b6c2a90
+Create Date: 2026-10-17 00:41:52.604318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a17e3f9b28'
+down_revision = '8d1e4b6c2a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing entries keep NULL: their files were never hashed, and NULLs do not conflict
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_timeline_user_date_content', ['user_id', 'date', 'content_hash'])
+
+
+def downgrade():
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_timeline_user_date_content', type_='unique')
+        batch_op.drop_column('content_hash')
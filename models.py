@@ -0,0 +1,55 @@
+from datetime import datetime, timezone
+
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class User(db.Model):
+    __tablename__ = 'user'
+
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    name = db.Column(db.String(100))
+    password_hash = db.Column(db.String(128), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=_utcnow)
+
+
+class Timeline(db.Model):
+    # content_hash identifies the uploaded files, so the same report is stored once per
+    # user and date; entries from before it was added have NULL, which never conflicts
+    __tablename__ = 'timeline'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'date', 'content_hash', name='uq_timeline_user_date_content'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.DateTime, nullable=False)
+    results = db.Column(db.JSON)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    content_hash = db.Column(db.String(64))
+
+
+class LabResult(db.Model):
+    # One row per biomarker and report, so per-test trends are range scans on
+    # (user_id, test, date) instead of decoding every timeline JSON blob
+    __tablename__ = 'lab_result'
+    __table_args__ = (
+        db.Index('ix_lab_result_user_test_date', 'user_id', 'test', 'date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    timeline_id = db.Column(db.Integer, db.ForeignKey('timeline.id', ondelete='CASCADE'), nullable=True, index=True)
+    test = db.Column(db.String(120), nullable=False)
+    date = db.Column(db.DateTime, nullable=False)
+    value = db.Column(db.Float)
+    unit = db.Column(db.String(40))
+    ref_low = db.Column(db.Float)
+    ref_high = db.Column(db.Float)
+    status = db.Column(db.String(10))
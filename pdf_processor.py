@@ -1,14 +1,147 @@
-import pdfplumber
-
-def extraer_texto_de_pdf(ruta_pdf):
-    all_text = ""
-    try:
-        with pdfplumber.open(ruta_pdf) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    all_text += text + "\n"
-        return all_text.split("\n")
-    except Exception as e:
-        print(f"ERROR: Fallo al abrir o extraer el PDF: {e}")
-        return []
\ No newline at end of file
+import io
+import os
+import time
+import logging
+import importlib.util
+
+import metrics
+
+# find_spec checks that PyMuPDF is installed without importing it
+PYMUPDF_DISPONIBLE = importlib.util.find_spec('pymupdf') is not None
+
+logger = logging.getLogger(__name__)
+
+PDF_BACKEND = os.environ.get('PDF_BACKEND', 'pymupdf')
+PDF_FALLBACK_BACKEND = 'pdfplumber'
+
+
+def _abrir_fuente(fuente_pdf):
+    # Paths and file objects go straight to the backend; in-memory buffers are
+    # wrapped without copying (BytesIO shares the bytes object until written to)
+    if isinstance(fuente_pdf, memoryview):
+        if isinstance(fuente_pdf.obj, bytes) and fuente_pdf.contiguous and fuente_pdf.nbytes == len(fuente_pdf.obj):
+            fuente_pdf = fuente_pdf.obj
+        else:
+            fuente_pdf = fuente_pdf.tobytes()
+    if isinstance(fuente_pdf, (bytes, bytearray)):
+        return io.BytesIO(fuente_pdf)
+    return fuente_pdf
+
+# Backends take an optional range of 0-based page numbers so a large document can be
+# split between processes; None means every page
+
+def _paginas_con_pdfplumber(fuente_pdf, paginas=None):
+    import pdfplumber
+
+    numeros = [numero + 1 for numero in paginas] if paginas is not None else None
+    with pdfplumber.open(_abrir_fuente(fuente_pdf), pages=numeros) as pdf:
+        for page in pdf.pages:
+            # pdfplumber keeps every page's characters and layout until the document is
+            # closed; closing each page once its text is out keeps memory flat in page count
+            try:
+                text = page.extract_text() or ""
+            finally:
+                page.close()
+            yield text
+
+def _abrir_pymupdf(fuente_pdf):
+    import pymupdf
+
+    fuente = _abrir_fuente(fuente_pdf)
+    if isinstance(fuente, (str, os.PathLike)):
+        return pymupdf.open(fuente)
+    if isinstance(fuente, io.BytesIO):
+        return pymupdf.open(stream=fuente, filetype="pdf")
+    return pymupdf.open(stream=fuente.read(), filetype="pdf")
+
+def _paginas_con_pymupdf(fuente_pdf, paginas=None):
+    with _abrir_pymupdf(fuente_pdf) as doc:
+        for page in (doc if paginas is None else (doc[numero] for numero in paginas)):
+            yield page.get_text("text", sort=True).rstrip("\n")
+
+BACKENDS = {
+    'pdfplumber': _paginas_con_pdfplumber,
+}
+if PYMUPDF_DISPONIBLE:
+    BACKENDS['pymupdf'] = _paginas_con_pymupdf
+
+def _registrar_tiempo(backend, paginas, segundos):
+    # Extraction runs in the pool's processes; these go through the metrics collector,
+    # which the parent replays into /metrics (extract_<backend> stage, pages counter)
+    metrics.record_stage(f"extract_{backend}", segundos)
+    metrics.count(metrics.PAGES, (backend,), paginas)
+    logger.info("PDF extraido con %s: %d paginas en %.3fs", backend, paginas, segundos)
+
+def contar_paginas(fuente_pdf):
+    if hasattr(fuente_pdf, 'seek'):
+        fuente_pdf.seek(0)
+    if PYMUPDF_DISPONIBLE:
+        with _abrir_pymupdf(fuente_pdf) as doc:
+            return doc.page_count
+
+    import pdfplumber
+    with pdfplumber.open(_abrir_fuente(fuente_pdf)) as pdf:
+        return len(pdf.pages)
+
+def rangos_de_paginas(total_paginas, paginas_por_rango):
+    return [range(inicio, min(inicio + paginas_por_rango, total_paginas))
+            for inicio in range(0, total_paginas, paginas_por_rango)]
+
+def tiene_lineas_utiles(lineas):
+    return any(any(c.isdigit() for c in linea) for linea in lineas)
+
+def iterar_paginas(fuente_pdf, backend, paginas=None):
+    # Yields the lines of each page as soon as it is extracted; only the time
+    # spent inside the backend is recorded, not the consumer's
+    if hasattr(fuente_pdf, 'seek'):
+        fuente_pdf.seek(0)
+    textos = BACKENDS[backend](fuente_pdf, paginas)
+    total_paginas = 0
+    segundos = 0.0
+    while True:
+        inicio = time.perf_counter()
+        try:
+            text = next(textos)
+        except StopIteration:
+            break
+        finally:
+            segundos += time.perf_counter() - inicio
+        total_paginas += 1
+        yield text.split("\n") if text else []
+    _registrar_tiempo(backend, total_paginas, segundos)
+
+def extraer_con_backend(fuente_pdf, backend, paginas=None):
+    return [linea for lineas in iterar_paginas(fuente_pdf, backend, paginas) for linea in lineas]
+
+def candidatos_backend(backend=None):
+    # The fast engine can split table cells differently, so pdfplumber's layout is always
+    # the last resort; unknown or uninstalled engines go straight to it
+    backend = backend or PDF_BACKEND
+    if backend not in BACKENDS:
+        backend = PDF_FALLBACK_BACKEND
+    return [backend] if backend == PDF_FALLBACK_BACKEND else [backend, PDF_FALLBACK_BACKEND]
+
+def registrar_fallo(backend, error):
+    logger.error("Fallo al abrir o extraer el PDF con %s: %s", backend, error)
+
+def con_respaldo(extraer, backend=None, util=bool):
+    """Returns extraer(engine) for the first engine of candidatos_backend whose result is useful.
+
+    This is the fallback rule of every extraction path: an engine that raises or finds
+    nothing useful is replaced by the next one for everything not delivered yet (here the
+    whole document; pipeline.iterar_analisis_paralelo applies it to the pages not yet
+    streamed). None when no engine gives a useful result.
+    """
+    for candidato in candidatos_backend(backend):
+        try:
+            resultado = extraer(candidato)
+        except Exception as e:
+            registrar_fallo(candidato, e)
+            continue
+        if util(resultado):
+            return resultado
+    return None
+
+def extraer_texto_de_pdf(fuente_pdf, backend=None):
+    lineas = con_respaldo(lambda candidato: extraer_con_backend(fuente_pdf, candidato), backend, tiene_lineas_utiles)
+    return lineas or []
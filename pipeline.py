@@ -0,0 +1,270 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+
+from pdf_processor import (
+    iterar_paginas, contar_paginas, rangos_de_paginas, candidatos_backend, con_respaldo, registrar_fallo,
+    PDF_BACKEND
+)
+from data_extractor import parsear_paginas, clasificar, PARSER_VERSION
+
+# Different extraction engines can produce slightly different lines, so cached results are per backend
+CACHE_VERSION = f"{PARSER_VERSION}-{PDF_BACKEND}"
+
+# Every gunicorn worker has its own pool, so by default the CPUs are divided between the
+# WEB_CONCURRENCY workers (gunicorn's own default for --workers) instead of each taking all
+MAX_WORKERS = int(os.environ.get(
+    'ANALYZE_WORKERS', max(1, (os.cpu_count() or 1) // max(1, int(os.environ.get('WEB_CONCURRENCY', 1))))
+))
+
+# Documents with at least this many pages are split into page ranges and extracted on
+# several pool processes; below it one process per file is cheaper than shipping the
+# PDF to every worker
+PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 32))
+PAGES_PER_TASK = int(os.environ.get('PDF_PAGES_PER_TASK', 8))
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _contexto():
+    # Pool children are started from a clean forkserver process, not forked from a gunicorn
+    # worker whose request, job and metrics threads may hold a lock at that moment
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    contexto = multiprocessing.get_context('forkserver')
+    contexto.set_forkserver_preload(['pipeline'])
+    return contexto
+
+
+def obtener_pool():
+    # Created lazily so every gunicorn worker builds its own pool after forking
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=_contexto())
+        return _pool
+
+
+def reiniciar_pool(roto):
+    # A child killed by the OOM killer or a crash in a PDF library breaks the whole
+    # executor; it is replaced once, by whichever thread notices first
+    global _pool
+    with _pool_lock:
+        if _pool is roto:
+            roto.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            logger.warning("El pool de procesos dejo de funcionar; se crea uno nuevo")
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=_contexto())
+        return _pool
+
+
+def _enviar(pool, funcion, *args):
+    # pool.submit that survives one broken pool: the task is submitted once more to the
+    # replacement. Cancelling the returned Future cancels the task it is waiting on
+    combinado = Future()
+    actual = [None]
+
+    def terminar(metodo, valor):
+        try:
+            metodo(valor)
+        except InvalidStateError:
+            # Cancelled by the caller meanwhile
+            pass
+
+    def reintentar(pool, intentos, error):
+        if not intentos:
+            terminar(combinado.set_exception, error)
+            return
+        lanzar(reiniciar_pool(pool), intentos - 1)
+
+    def lanzar(pool, intentos):
+        try:
+            future = pool.submit(funcion, *args)
+        except BrokenProcessPool:
+            # Broken by an earlier task before this one ran; that does not use up its retry
+            lanzar(reiniciar_pool(pool), intentos)
+            return
+        actual[0] = future
+
+        def terminado(future):
+            if future.cancelled():
+                combinado.cancel()
+                return
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                reintentar(pool, intentos, error)
+            elif error is not None:
+                terminar(combinado.set_exception, error)
+            else:
+                terminar(combinado.set_result, future.result())
+
+        future.add_done_callback(terminado)
+
+    def cancelado(combinado):
+        if combinado.cancelled() and actual[0] is not None:
+            actual[0].cancel()
+
+    combinado.add_done_callback(cancelado)
+    lanzar(pool, 1)
+    return combinado
+
+def _parsear_documento(fuente_pdf, backend, paginas=None):
+    # Page by page, so only the current page's text is alive while the rows accumulate;
+    # the whole document is never held as one list of lines
+    resultados = []
+    for parcial in parsear_paginas(iterar_paginas(fuente_pdf, backend, paginas)):
+        resultados.extend(parcial)
+    return resultados
+
+
+def analizar_pdf(fuente_pdf, backend=None):
+    resultados = con_respaldo(lambda candidato: _parsear_documento(fuente_pdf, candidato), backend)
+    return clasificar(resultados or [])
+
+
+def analizar_pdf_medido(fuente_pdf, backend=None):
+    # Entry point for the process pool: stage timings and page counts recorded in the
+    # worker are returned with the result so the parent can replay them into /metrics
+    with metrics.collecting() as collected:
+        resultados = analizar_pdf(fuente_pdf, backend)
+    return resultados, collected
+
+def analizar_paginas(fuente_pdf, backend, paginas):
+    # Lines are parsed independently, so a page range can be parsed and classified on its
+    # own and the ranges concatenated in page order give the same rows as the whole file.
+    # There is no per-range fallback: narrative pages legitimately have no rows, and the
+    # pdfplumber retry is decided by the callers with the rule of con_respaldo
+    return clasificar(_parsear_documento(fuente_pdf, backend, paginas))
+
+
+def analizar_paginas_medido(fuente_pdf, backend, paginas):
+    with metrics.collecting() as collected:
+        resultados = analizar_paginas(fuente_pdf, backend, paginas)
+    return resultados, collected
+
+
+def _total_paginas(fuente_pdf):
+    try:
+        return contar_paginas(fuente_pdf)
+    except Exception as e:
+        logger.warning("No se pudieron contar las paginas del PDF: %s", e)
+        return None
+
+
+def rangos_paralelos(fuente_pdf):
+    # None when the document is too small (or cannot be opened here) to be worth splitting;
+    # unreadable files then take the normal path and its error handling
+    if MAX_WORKERS < 2:
+        return None
+    total = _total_paginas(fuente_pdf)
+    if total is None or total < PARALLEL_MIN_PAGES:
+        return None
+    return rangos_de_paginas(total, PAGES_PER_TASK)
+
+
+def rangos_streaming(fuente_pdf):
+    # Ranges for a streamed upload, always run on the pool: large documents are split as in
+    # rangos_paralelos, smaller ones are one task, since every task ships and reopens the
+    # whole PDF. None when the pages cannot be counted
+    total = _total_paginas(fuente_pdf)
+    if total is None:
+        return None
+    if MAX_WORKERS >= 2 and total >= PARALLEL_MIN_PAGES:
+        return rangos_de_paginas(total, PAGES_PER_TASK)
+    return rangos_de_paginas(total, max(total, 1))
+
+
+def _unir_resultados(partes):
+    resultados = []
+    collected = {'stages': [], 'counts': []}
+    for parcial, medido in partes:
+        resultados.extend(parcial)
+        collected['stages'].extend(medido['stages'])
+        collected['counts'].extend(medido['counts'])
+    return resultados, collected
+
+
+def enviar_analisis(pool, fuente_pdf, backend=None):
+    """Submits one PDF to the pool and returns a Future for (results, collected metrics).
+
+    Large documents are split into page ranges that run in parallel; the returned Future
+    completes when every range has finished, with the rows merged in page order. Nothing
+    is delivered before the end, so by the rule of con_respaldo the whole document is
+    retried with pdfplumber when the chosen engine fails in any range or finds no rows.
+    """
+    rangos = rangos_paralelos(fuente_pdf)
+    if rangos is None:
+        return _enviar(pool, analizar_pdf_medido, fuente_pdf, backend)
+
+    combinado = Future()
+    candidatos = candidatos_backend(backend)
+
+    def enviar(intento, previo):
+        candidato = candidatos[intento]
+        futures = [_enviar(pool, analizar_paginas_medido, fuente_pdf, candidato, rango) for rango in rangos]
+        pendientes = [len(futures)]
+        lock = threading.Lock()
+
+        def terminado(_):
+            with lock:
+                pendientes[0] -= 1
+                if pendientes[0]:
+                    return
+            try:
+                resultados, collected = _unir_resultados(previo + [future.result() for future in futures])
+            except Exception as e:
+                registrar_fallo(candidato, e)
+                resultados, collected = [], _unir_resultados(previo)[1]
+            if not resultados and intento + 1 < len(candidatos):
+                try:
+                    enviar(intento + 1, [([], collected)])
+                except Exception as e:
+                    combinado.set_exception(e)
+                return
+            combinado.set_result((resultados, collected))
+
+        for future in futures:
+            future.add_done_callback(terminado)
+
+    enviar(0, [])
+    return combinado
+
+
+def iterar_analisis_paralelo(pool, fuente_pdf, rangos, backend=None):
+    # Streaming counterpart of enviar_analisis: yields (first page, results, collected) per
+    # range, in page order, while the later ranges are still being extracted. The fallback
+    # follows con_respaldo for what has not been sent: when the chosen engine finds nothing,
+    # or fails before finding anything, every range is retried with pdfplumber; when it
+    # fails after rows were sent, only the ranges from the failed one on are retried
+    pendientes = list(rangos)
+    encontrado = False
+    for candidato in candidatos_backend(backend):
+        fallido = None
+        futures = [(rango, _enviar(pool, analizar_paginas_medido, fuente_pdf, candidato, rango)) for rango in pendientes]
+        try:
+            for indice, (rango, future) in enumerate(futures):
+                try:
+                    resultados, collected = future.result()
+                except Exception as e:
+                    registrar_fallo(candidato, e)
+                    fallido = indice
+                    break
+                encontrado = encontrado or bool(resultados)
+                yield rango.start + 1, resultados, collected
+        finally:
+            # The client may disconnect mid-stream; ranges that have not started are dropped
+            for _, future in futures:
+                future.cancel()
+        if fallido is None and encontrado:
+            return
+        if encontrado:
+            pendientes = pendientes[fallido:]
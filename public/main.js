@@ -152,7 +152,7 @@ async function processReports() {
     
     try {
         const formData = new FormData();
-        formData.append('files', uploadedFiles[0]);
+        uploadedFiles.forEach(file => formData.append('files', file));
         formData.append('date', reportDate);
 
         const response = await fetch(`${API_BASE_URL}/analyze`, {
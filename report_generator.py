@@ -1,33 +1,109 @@
+import io
 import os
 import re
-import google.genai as genai 
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_JUSTIFY
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-
-def _configurar_cliente_gemini():
-    API_KEY = os.getenv("GEMINI_API_KEY")
-    if not API_KEY:
-        raise ValueError("No se encontró la GEMINI_API_KEY.")
-    
-    os.environ["GEMINI_API_KEY"] = API_KEY 
-    return genai.Client()
+import json
+import math
+import hashlib
+import time
+from functools import lru_cache
+from collections import defaultdict, deque
+
+from cache import ResultCache
+from llm_client import obtener_llm
+from biomarkers import canonizar
+import metrics
+
+# Bump whenever _generate_prompt or _lab_results_to_text changes so cached reports are regenerated
+PROMPT_VERSION = "2"
 
-def _lab_results_to_text(df):
+_REPORT_CACHE_TTL = os.environ.get("REPORT_CACHE_TTL")
+report_cache = ResultCache(
+    max_items=int(os.environ.get("REPORT_CACHE_SIZE", 512)),
+    disk_dir=os.environ.get("REPORT_CACHE_DIR"),
+    disk_max_bytes=int(os.environ.get("REPORT_CACHE_MAX_MB", 64)) * 1024 * 1024,
+    ttl=int(_REPORT_CACHE_TTL) if _REPORT_CACHE_TTL else 7 * 24 * 3600
+)
+
+# A Normal result within this relative distance of the previous report's value counts as unchanged
+REPORT_DIFF_TOLERANCE = float(os.environ.get("REPORT_DIFF_TOLERANCE", 0.05))
+
+def _lab_results_to_text(resultados):
     lines = []
-    for _, row in df.iterrows():
-        row_dict = row.to_dict()
+    for resultado in resultados:
         line = (
-            f"{row_dict['test']}: {row_dict['value']} {row_dict['unit']} "
-            f"(reference range {row_dict['refLow']}–{row_dict['refHigh']}). "
-            f"Status: {row_dict['status']}."
+            f"{resultado.test}: {resultado.value} {resultado.unit} "
+            f"(reference range {resultado.ref_low}–{resultado.ref_high}). "
+            f"Status: {resultado.status}."
         )
         lines.append(line)
     return "Here are the patient's laboratory results:\n\n" + "\n".join(lines)
 
 
+def _id_biomarcador(resultado):
+    return resultado.test_id or canonizar(resultado.test) or resultado.test.strip().lower()
+
+
+def _sin_cambios(resultado, anterior):
+    if resultado.status != "Normal" or anterior.status != "Normal" or resultado.unit != anterior.unit:
+        return False
+    if math.isnan(resultado.value) or math.isnan(anterior.value):
+        return False
+    return abs(resultado.value - anterior.value) <= REPORT_DIFF_TOLERANCE * max(abs(anterior.value), 1e-9)
+
+
+def comparar_resultados(resultados, anteriores):
+    """Splits resultados against the previous report into (destacados, estables).
+
+    destacados are (resultado, previous ResultadoLab or None) pairs for every result that is
+    abnormal, new, or moved more than REPORT_DIFF_TOLERANCE; estables are the Normal results
+    that were also Normal, with about the same value, last time.
+    """
+    # Some panels repeat a biomarker (e.g. fasting and post-load glucose); repeats are
+    # paired with the previous report's in the order they appear
+    previos = defaultdict(deque)
+    for anterior in anteriores:
+        previos[_id_biomarcador(anterior)].append(anterior)
+    destacados = []
+    estables = []
+    for resultado in resultados:
+        cola = previos.get(_id_biomarcador(resultado))
+        anterior = cola.popleft() if cola else None
+        if anterior is not None and _sin_cambios(resultado, anterior):
+            estables.append(resultado)
+        else:
+            destacados.append((resultado, anterior))
+    return destacados, estables
+
+
+def _lab_results_to_text_incremental(destacados, estables, fecha_anterior):
+    lines = []
+    for resultado, anterior in destacados:
+        line = (
+            f"{resultado.test}: {resultado.value} {resultado.unit} "
+            f"(reference range {resultado.ref_low}–{resultado.ref_high}). "
+            f"Status: {resultado.status}."
+        )
+        if anterior is None:
+            line += " Not in the previous report."
+        else:
+            line += f" Previous: {anterior.value} {anterior.unit} ({anterior.status})."
+        lines.append(line)
+
+    content = f"Here are the patient's laboratory results compared with their previous report ({fecha_anterior}):\n\n"
+    if lines:
+        content += "\n".join(lines) + "\n\n"
+    if estables:
+        nombres = ", ".join(dict.fromkeys(resultado.test for resultado in estables))
+        content += f"Unchanged and within the normal range since the previous report ({len(estables)}): {nombres}."
+    return content.rstrip()
+
+
+def estimar_tokens(texto):
+    # Local estimate (about four characters per token for English prompts); close enough to
+    # compare prompt sizes without a round trip to the model's token counter
+    return max(1, round(len(texto) / 4))
+
+
 def _generate_prompt(content, tipo_prompt):
     if tipo_prompt == "doctor":
         return f"""
@@ -70,27 +146,153 @@ Please write a simple summary for the patient following these rules:
     and will give you the best recommendations. Always talk to your doctor!"
 """
 
-def generar_reporte_ia(df, tipo_prompt):
-    client = _configurar_cliente_gemini()
-    content = _lab_results_to_text(df)
-    prompt = _generate_prompt(content, tipo_prompt)
+def _valor_canonico(value):
+    # null, NaN and infinite bounds all mean "no limit" once they have been through JSON
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        value = float(value)
+        return None if math.isnan(value) or math.isinf(value) else round(value, 6)
+    return str(value).strip()
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash", 
-        contents=prompt
+def _filas_clave(resultados):
+    columnas = ['test', 'value', 'unit', 'ref_low', 'ref_high', 'status']
+    return sorted(
+        ([_valor_canonico(getattr(resultado, col)) for col in columnas] for resultado in resultados),
+        key=lambda fila: json.dumps(fila)
     )
-    return response.text
 
-def create_medical_report_pdf(output_filename, report_text):
-    doc = SimpleDocTemplate(output_filename, pagesize=letter, topMargin=inch, bottomMargin=inch, leftMargin=inch, rightMargin=inch)
+def clave_reporte(resultados, tipo_prompt, model=None, anterior=None):
+    # A narrative written against a previous report (anterior = (date, rows)) mentions that
+    # report, so its key also covers the previous rows and date: it is only served to
+    # requests with the same history, never to one for the results alone
+    datos = {
+        'rows': _filas_clave(resultados),
+        'type': tipo_prompt,
+        'prompt_version': PROMPT_VERSION,
+        'model': model or obtener_llm().model_name
+    }
+    if anterior is not None:
+        fecha_anterior, anteriores = anterior
+        datos['mode'] = 'incremental'
+        datos['previous'] = {
+            'date': str(fecha_anterior),
+            'rows': _filas_clave(anteriores),
+            'tolerance': REPORT_DIFF_TOLERANCE
+        }
+    payload = json.dumps(datos, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _preparar_prompt(resultados, tipo_prompt, llm, anterior, info):
+    """Returns (cache key, cached text or None, prompt) and fills info with the prompt sizes.
+
+    anterior is (date, ResultadoLab rows) of the patient's previous report, or None. With it,
+    only the destacados are sent in full and the stable normals as a one-line list, even
+    when nothing stands out: a narrative is never reused for values other than the ones it
+    was written from (identical rows are already served from the cache by their own key).
+    Incremental narratives are cached under a key that includes the previous report.
+    """
+    key = clave_reporte(resultados, tipo_prompt, llm.model_name)
+    info['mode'] = 'full'
+    cached = report_cache.get(key)
+    if cached is not None:
+        info['mode'] = 'cached'
+        return key, cached, None
+
+    prompt = _generate_prompt(_lab_results_to_text(resultados), tipo_prompt)
+    info['prompt_tokens_full'] = info['prompt_tokens_sent'] = estimar_tokens(prompt)
+    if anterior is not None:
+        fecha_anterior, anteriores = anterior
+        destacados, estables = comparar_resultados(resultados, anteriores)
+        incremental = _generate_prompt(
+            _lab_results_to_text_incremental(destacados, estables, fecha_anterior), tipo_prompt
+        )
+        # With mostly abnormal panels the previous values make the prompt longer, not shorter
+        if estimar_tokens(incremental) < info['prompt_tokens_full']:
+            key = clave_reporte(resultados, tipo_prompt, llm.model_name, anterior)
+            cached = report_cache.get(key)
+            if cached is not None:
+                # As for the plain cache hit, nothing is sent and no prompt sizes are reported
+                info.clear()
+                info['mode'] = 'cached'
+                return key, cached, None
+            prompt = incremental
+            info['mode'] = 'incremental'
+            info['prompt_tokens_sent'] = estimar_tokens(prompt)
+
+    _contar_tokens(info)
+    return key, None, prompt
+
+
+def _contar_tokens(info):
+    metrics.count(metrics.PROMPT_TOKENS, ("full",), info['prompt_tokens_full'])
+    metrics.count(metrics.PROMPT_TOKENS, ("sent",), info['prompt_tokens_sent'])
+
+
+def generar_reporte_ia(resultados, tipo_prompt, anterior=None, info=None):
+    llm = obtener_llm()
+    info = {} if info is None else info
+    key, cached, prompt = _preparar_prompt(resultados, tipo_prompt, llm, anterior, info)
+    if cached is not None:
+        return cached
+
+    with metrics.stage("llm"):
+        report_text = llm.generate(prompt)
+    if report_text:
+        report_cache.set(key, report_text)
+    return report_text
+
+def generar_reporte_ia_stream(resultados, tipo_prompt, anterior=None, info=None):
+    llm = obtener_llm()
+    info = {} if info is None else info
+    key, cached, prompt = _preparar_prompt(resultados, tipo_prompt, llm, anterior, info)
+    if cached is not None:
+        yield cached
+        return
+
+    chunks = []
+    inicio = time.perf_counter()
+    for chunk in llm.generate_stream(prompt):
+        if not chunks:
+            metrics.record_stage("llm_first_token", time.perf_counter() - inicio)
+        chunks.append(chunk)
+        yield chunk
+    metrics.record_stage("llm", time.perf_counter() - inicio)
+    if chunks:
+        report_cache.set(key, "".join(chunks))
+
+@lru_cache(maxsize=None)
+def _doc_options():
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    return dict(pagesize=letter, topMargin=inch, bottomMargin=inch, leftMargin=inch, rightMargin=inch)
+
+@lru_cache(maxsize=None)
+def _report_styles():
+    # Built once per process; the styles are only read while documents are built
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_JUSTIFY
+
     styles = getSampleStyleSheet()
     styles.add(ParagraphStyle(name="Normal_Justified", parent=styles["Normal"], alignment=TA_JUSTIFY, spaceAfter=12, leading=14))
+    return styles
+
+def create_medical_report_pdf(output_filename, report_text):
+    from reportlab.platypus import SimpleDocTemplate, Paragraph
+
+    doc = SimpleDocTemplate(output_filename, **_doc_options())
+    style = _report_styles()["Normal_Justified"]
     
     Story = []
     blocks = report_text.strip().split('\n\n')
 
     for block in blocks:
         if block.strip():
-            Story.append(Paragraph(block.strip(), styles["Normal_Justified"]))
+            Story.append(Paragraph(block.strip(), style))
             
-    doc.build(Story)
\ No newline at end of file
+    doc.build(Story)
+
+def render_medical_report_pdf(report_text):
+    buffer = io.BytesIO()
+    create_medical_report_pdf(buffer, report_text)
+    return buffer.getvalue()
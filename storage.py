@@ -0,0 +1,149 @@
+import math
+import hashlib
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+
+import metrics
+import analytics
+from models import db, Timeline, LabResult
+from biomarkers import canonizar
+from resultados import a_registros, desde_registros
+
+
+def _float_or_none(value):
+    # Infinite bounds (thresholds such as "> 40") and NaN are stored as NULL
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) or math.isinf(value) else value
+
+
+def _nombre_test(registro):
+    # Canonical ids make the same biomarker line up across labs and languages; unknown
+    # names keep the text the lab printed
+    return str(registro.get('testId') or registro['test'])[:120]
+
+
+def filas_lab_result(user_id, fecha, registros, timeline_id=None):
+    return [
+        {
+            'user_id': user_id,
+            'timeline_id': timeline_id,
+            'test': _nombre_test(registro),
+            'date': fecha,
+            'value': _float_or_none(registro.get('value')),
+            'unit': registro.get('unit') or '',
+            'ref_low': _float_or_none(registro.get('refLow')),
+            'ref_high': _float_or_none(registro.get('refHigh')),
+            'status': registro.get('status'),
+        }
+        for registro in registros
+    ]
+
+
+def huella_reporte(digests):
+    """Fingerprint of a report from the SHA-256 digests of its uploaded files, in any order."""
+    return hashlib.sha256("\n".join(sorted(digests)).encode()).hexdigest()
+
+
+def _timeline_existente(user_id, fecha, content_hash):
+    if content_hash is None:
+        return None
+    return db.session.scalars(
+        select(Timeline).where(Timeline.user_id == user_id, Timeline.date == fecha, Timeline.content_hash == content_hash)
+    ).first()
+
+
+def guardar_reporte(user_id, fecha, resultados, registros=None, content_hash=None):
+    """Stores one analysed report: the timeline JSON entry plus one lab_result row per biomarker.
+
+    resultados are the classified ResultadoLab rows from analyze_reports; registros can be
+    passed when their API records have already been built for the response. With a
+    content_hash (see huella_reporte), storing the same files for the same user and date
+    again replaces that entry's rows instead of adding a second entry.
+    """
+    if isinstance(fecha, str):
+        fecha = datetime.strptime(fecha, '%Y-%m-%d')
+    if registros is None:
+        registros = a_registros(resultados)
+
+    with metrics.stage('db_store'):
+        for intento in range(2):
+            timeline = _timeline_existente(user_id, fecha, content_hash)
+            if timeline is None:
+                timeline = Timeline(user_id=user_id, date=fecha, results=registros, content_hash=content_hash)
+                db.session.add(timeline)
+            else:
+                timeline.results = registros
+                db.session.execute(delete(LabResult).where(LabResult.timeline_id == timeline.id))
+            try:
+                db.session.flush()
+            except IntegrityError:
+                # A concurrent request stored the same report first; update its entry instead
+                db.session.rollback()
+                if intento:
+                    raise
+                continue
+            break
+        filas = filas_lab_result(user_id, fecha, registros, timeline.id)
+        if filas:
+            db.session.execute(insert(LabResult), filas)
+        db.session.commit()
+    analytics.invalidar(user_id)
+    return timeline.id
+
+
+def reporte_anterior(user_id, timeline_id=None, fecha=None, distinto_de=None):
+    """(date string, ResultadoLab rows) of the user's latest report before a reference one, or None.
+
+    The reference is a stored timeline entry (timeline_id) or a report date. Without either,
+    the latest stored report is used unless its rows equal distinto_de: the report being
+    described has usually just been stored by /api/analyze and is not its own predecessor.
+    """
+    query = select(Timeline).where(Timeline.user_id == user_id)
+    if timeline_id is not None:
+        referencia = db.session.get(Timeline, timeline_id)
+        if referencia is None or referencia.user_id != user_id:
+            return None
+        query = query.where(Timeline.id != timeline_id, Timeline.date <= referencia.date)
+    elif fecha is not None:
+        if isinstance(fecha, str):
+            fecha = datetime.strptime(fecha, '%Y-%m-%d')
+        query = query.where(Timeline.date < fecha)
+    query = query.order_by(Timeline.date.desc(), Timeline.id.desc()).limit(3)
+
+    for timeline in db.session.scalars(query):
+        anteriores = desde_registros(timeline.results or [])
+        if not anteriores or (distinto_de is not None and anteriores == distinto_de):
+            continue
+        return timeline.date.strftime('%Y-%m-%d'), anteriores
+    return None
+
+
+def tendencia(user_id, test, desde=None, hasta=None, limite=None):
+    test = canonizar(test) or test
+    query = (
+        select(LabResult.date, LabResult.value, LabResult.unit, LabResult.ref_low, LabResult.ref_high, LabResult.status)
+        .where(LabResult.user_id == user_id, LabResult.test == test)
+    )
+    if desde is not None:
+        query = query.where(LabResult.date >= desde)
+    if hasta is not None:
+        query = query.where(LabResult.date <= hasta)
+    query = query.order_by(LabResult.date)
+    if limite:
+        query = query.limit(limite)
+
+    return [
+        {
+            'date': fila.date.strftime('%Y-%m-%d'),
+            'value': fila.value,
+            'unit': fila.unit,
+            'refLow': fila.ref_low,
+            'refHigh': fila.ref_high,
+            'status': fila.status,
+        }
+        for fila in db.session.execute(query)
+    ]
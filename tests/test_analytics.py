@@ -0,0 +1,16 @@
+import pandas as pd
+import pytest
+
+from analytics import calcular_pendientes
+
+
+@pytest.mark.parametrize("unidad", ["s", "ms", "us", "ns"])
+def test_slope_is_per_day_at_any_datetime_resolution(unidad):
+    df = pd.DataFrame({
+        "test": ["Glucosa"] * 3 + ["HDL"] * 2,
+        "value": [90.0, 92.0, 94.0, 50.0, 40.0],
+        "date": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-01", "2024-01-11"]).as_unit(unidad),
+    })
+    pendientes = calcular_pendientes(df)
+    assert pendientes["Glucosa"] == pytest.approx(2.0)
+    assert pendientes["HDL"] == pytest.approx(-1.0)
@@ -0,0 +1,68 @@
+import math
+import random
+
+import pandas as pd
+import pytest
+
+import referencia
+from data_extractor import clasificar, clasificar_resultados
+from resultados import ResultadoLab
+
+inf = math.inf
+nan = math.nan
+
+# (value, ref_low, ref_high): open-ended bounds, NaN, zero-width ranges and values exactly
+# on a bound or on the 25% "Near" margin
+CASOS_LIMITE = [
+    (5.0, 0.0, 10.0), (0.0, 0.0, 10.0), (10.0, 0.0, 10.0), (12.5, 0.0, 10.0), (12.6, 0.0, 10.0),
+    (-2.5, 0.0, 10.0), (-2.6, 0.0, 10.0),
+    (30.0, 40.0, inf), (40.0, 40.0, inf), (29.0, 40.0, inf), (50.0, 40.0, inf), (0.0, 0.0, inf),
+    (130.0, -inf, 100.0), (125.0, -inf, 100.0), (126.0, -inf, 100.0), (-5.0, -inf, 0.0),
+    (5.0, 5.0, 5.0), (5.1, 5.0, 5.0), (4.9, 5.0, 5.0), (6.0, 6.0, 5.0),
+    (nan, 0.0, 10.0), (5.0, nan, 10.0), (5.0, 0.0, nan), (nan, nan, nan),
+    (inf, 0.0, 10.0), (-inf, 0.0, 10.0), (inf, 40.0, inf), (-inf, -inf, 100.0),
+]
+
+
+def _filas_aleatorias(n, seed=0):
+    rng = random.Random(seed)
+    filas = []
+    for _ in range(n):
+        low = round(rng.uniform(-5, 100), rng.choice([0, 1, 2]))
+        high = round(low + rng.choice([0.0, rng.uniform(0, 50)]), rng.choice([0, 1, 2]))
+        forma = rng.random()
+        if forma < 0.15:
+            high = inf
+        elif forma < 0.25:
+            low = -inf
+        value = round(rng.uniform(-20, 180), rng.choice([0, 1, 2]))
+        filas.append((value, low, high))
+    return filas
+
+
+def _frame(filas):
+    df = pd.DataFrame(filas, columns=["Value", "Ref Low", "Ref High"])
+    df.insert(0, "Test", [f"T{i}" for i in range(len(df))])
+    df.insert(3, "Unit", "")
+    # Duplicate index labels, as after concatenating the pages of a report
+    df.index = [i % 7 for i in range(len(df))]
+    return df
+
+
+@pytest.mark.parametrize("filas", [CASOS_LIMITE, _filas_aleatorias(5000)], ids=["limits", "random"])
+def test_vectorized_matches_row_wise_apply(filas):
+    esperado = referencia.clasificar_resultados(_frame(filas).copy())["Status"].tolist()
+    actual = clasificar_resultados(_frame(filas))["Status"].tolist()
+    assert actual == esperado
+
+
+@pytest.mark.parametrize("filas", [CASOS_LIMITE, _filas_aleatorias(5000, seed=1)], ids=["limits", "random"])
+def test_record_classification_matches_row_wise_apply(filas):
+    esperado = referencia.clasificar_resultados(_frame(filas).copy())["Status"].tolist()
+    resultados = clasificar([ResultadoLab(f"T{i}", value, "", low, high) for i, (value, low, high) in enumerate(filas)])
+    assert [resultado.status for resultado in resultados] == esperado
+
+
+def test_empty_inputs():
+    assert clasificar([]) == []
+    assert clasificar_resultados(_frame([])).empty
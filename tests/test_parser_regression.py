@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+import referencia
+from biomarkers import buscar_al_inicio
+from data_extractor import parsear_lineas_a_dataframe, _LIMPIEZA
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "lineas_laboratorio.txt")
+COLUMNAS = ["Test", "Value", "Unit", "Ref Low", "Ref High"]
+
+
+def _lineas():
+    with open(CORPUS, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def _filas(df):
+    return df[COLUMNAS].values.tolist()
+
+
+# Stand-ins the baseline parses the way the current parser reads the real text
+_NOMBRE = "Biomarcador"
+_UNIDAD_EGFR = "1.73 m2"
+_UNIDAD_SIN_DIGITOS = "ESCm"
+MOTIVOS = [("egfr_unit",), ("biomarker_name",), ("egfr_unit", "biomarker_name")]
+
+
+def _esperado(linea, motivos):
+    """Baseline rows for the line with the given intentional changes applied."""
+    limpia = linea.strip().translate(_LIMPIEZA)
+    nombre = None
+    if "biomarker_name" in motivos:
+        encontrado = buscar_al_inicio(limpia)
+        if encontrado is None:
+            return None
+        nombre = limpia[:encontrado[0]].strip()
+        limpia = _NOMBRE + limpia[encontrado[0]:]
+    if "egfr_unit" in motivos:
+        if _UNIDAD_EGFR not in limpia:
+            return None
+        limpia = limpia.replace(_UNIDAD_EGFR, _UNIDAD_SIN_DIGITOS)
+
+    filas = _filas(referencia.parsear_lineas_a_dataframe([limpia]))
+    for fila in filas:
+        if nombre is not None and fila[0] == _NOMBRE:
+            fila[0] = nombre
+        fila[2] = fila[2].replace(_UNIDAD_SIN_DIGITOS, _UNIDAD_EGFR)
+    return filas
+
+
+def _diferencia_esperada(linea, actual):
+    """Intentional changes that explain a difference from the baseline, or None.
+
+    Each change is applied to the line before the baseline parses it, so the whole
+    row (value, unit and range) still has to match, not just the part that changed:
+    - egfr_unit: "mL/min/1,73 m2" is one unit, not the value 1.73 followed by "m2"
+    - biomarker_name: lines that start with a known biomarker name are read from the
+      end of that name, so names with digits ("T4 Libre", "Vitamin B12") are no
+      longer cut at the first number
+    """
+    for motivos in MOTIVOS:
+        if actual == _esperado(linea, motivos):
+            return motivos
+    return None
+
+
+def test_matches_baseline_parser_on_corpus():
+    diferencias = []
+    explicadas = {"malformed_number": 0, "egfr_unit": 0, "biomarker_name": 0}
+    for linea in _lineas():
+        actual = _filas(parsear_lineas_a_dataframe([linea]))
+        try:
+            esperado = _filas(referencia.parsear_lineas_a_dataframe([linea]))
+        except ValueError:
+            # The baseline failed the whole report on numbers such as "1.234.5"; those
+            # matches are now skipped and the rest of the line is still read
+            explicadas["malformed_number"] += 1
+            continue
+        if actual == esperado:
+            continue
+        motivos = _diferencia_esperada(linea, actual)
+        if motivos is None:
+            diferencias.append((linea, esperado, actual))
+        for motivo in motivos or ():
+            explicadas[motivo] += 1
+
+    assert diferencias == []
+    # The corpus exercises every intentional difference
+    assert all(explicadas.values()), explicadas
+
+
+@pytest.mark.parametrize("linea, esperado", [
+    ("Hemoglobina 13,5 g/dL 12,0 - 16,0", [["Hemoglobina", 13.5, "g/dL", 12.0, 16.0]]),
+    ("HDL 52 mg/dL > 40", [["HDL", 52.0, "mg/dL", 40.0, float("inf")]]),
+    ("eGFR 85 mL/min/1,73 m2 > 60", [["eGFR", 85.0, "mL/min/1.73 m2", 60.0, float("inf")]]),
+    ("T4 Libre 1,2 ng/dL 0,8 - 1,8", [["T4 Libre", 1.2, "ng/dL", 0.8, 1.8]]),
+    ("Glucosa basal 1.234.5 mg/dL 70 - 100", []),
+    ("Página 2 de 3", []),
+])
+def test_known_lines(linea, esperado):
+    assert _filas(parsear_lineas_a_dataframe([linea])) == esperado
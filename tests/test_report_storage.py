@@ -0,0 +1,60 @@
+import io
+import importlib
+
+import pytest
+from sqlalchemy import func, select
+
+from benchmarks.synthetic_reports import generar_pdf
+
+
+@pytest.fixture
+def aplicacion(monkeypatch, tmp_path):
+    # app.py reads its configuration at import time, so it is imported once the
+    # environment points it at an in-memory database and a scratch jobs directory
+    monkeypatch.setenv("DATABASE_URL", "sqlite://")
+    monkeypatch.setenv("REPORT_JOBS_DIR", str(tmp_path / "jobs"))
+    monkeypatch.delenv("RESULT_CACHE_DIR", raising=False)
+    aplicacion = importlib.import_module("app")
+    from models import db, User
+
+    with aplicacion.app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(User(id=1, username="ana", email="ana@example.com", password_hash="x"))
+        db.session.commit()
+        yield aplicacion
+        db.session.remove()
+
+
+def _subir(cliente, pdf, fecha="2024-03-01"):
+    respuesta = cliente.post(
+        "/api/analyze",
+        data={"files": (io.BytesIO(pdf), "reporte.pdf"), "user_id": "1", "date": fecha},
+        content_type="multipart/form-data",
+    )
+    assert respuesta.status_code == 200, respuesta.get_json()
+    return respuesta.get_json()
+
+
+def _contar(modelo):
+    from models import db
+    return db.session.scalar(select(func.count()).select_from(modelo))
+
+
+def test_same_report_uploaded_twice_is_stored_once(aplicacion):
+    from models import Timeline, LabResult
+
+    cliente = aplicacion.app.test_client()
+    pdf = generar_pdf(1, seed=3)
+
+    primera = _subir(cliente, pdf)
+    filas = _contar(LabResult)
+    segunda = _subir(cliente, pdf)
+
+    assert segunda["timeline_id"] == primera["timeline_id"]
+    assert _contar(Timeline) == 1
+    assert _contar(LabResult) == filas == len(primera["results"])
+
+    # The same files on another date are another report
+    _subir(cliente, pdf, fecha="2024-04-01")
+    assert _contar(Timeline) == 2
@@ -0,0 +1,82 @@
+"""Loads, in one go, everything the first requests of a worker would otherwise pay for.
+
+pandas, NumPy, pdfplumber, PyMuPDF, google.genai, httpx and reportlab are imported
+inside the functions that use them rather than with the app, so importing app.py stays
+cheap; without a warm-up they are loaded by the first request that needs each one.
+
+The gunicorn config calls precalentar() in the master before workers are forked, so
+the libraries, stylesheets, parser tables and LLM client are built once and shared
+copy-on-write by every worker instead of being rebuilt after each (re)start.
+"""
+import gc
+import os
+import time
+import logging
+
+from pdf_processor import BACKENDS
+from data_extractor import iterar_resultados, _estados
+from llm_client import GeminiBackend, _genai, obtener_llm
+from report_generator import _doc_options, _report_styles
+
+logger = logging.getLogger(__name__)
+
+
+def _importar_librerias():
+    import numpy
+    import pandas
+    import pdfplumber
+    if 'pymupdf' in BACKENDS:
+        import pymupdf
+    import httpx
+    import reportlab.platypus
+    _genai()
+
+
+def _preparar_parser():
+    # Runs the compiled patterns, the biomarker trie and the NumPy classification once,
+    # without the metrics wrappers so nothing is counted in the master
+    filas = list(iterar_resultados(["Glucose 92 mg/dL 70 - 100", "HDL 52 mg/dL > 40"]))
+    columnas = list(zip(*filas))
+    import numpy as np
+    _estados(np.array(columnas[1]), np.array(columnas[3]), np.array(columnas[4]))
+
+
+def _preparar_llm():
+    llm = obtener_llm()
+    if isinstance(llm.backend, GeminiBackend) and os.getenv("GEMINI_API_KEY"):
+        # Only builds the client object; no connection is opened before the fork
+        llm.backend.client()
+
+
+def _preparar_estilos():
+    _doc_options()
+    _report_styles()
+
+
+PASOS = [
+    ('imports', _importar_librerias),
+    ('parser', _preparar_parser),
+    ('llm_client', _preparar_llm),
+    ('report_styles', _preparar_estilos),
+]
+
+
+def precalentar(congelar=False):
+    """Runs every warm-up step and returns how long each one took, in seconds.
+
+    With congelar=True the objects built so far are moved out of the garbage collector's
+    generations (gc.freeze), so collections in the forked workers do not touch, and copy,
+    the shared pages.
+    """
+    tiempos = {}
+    for nombre, paso in PASOS:
+        inicio = time.perf_counter()
+        try:
+            paso()
+        except Exception as e:
+            logger.warning("Paso de precalentamiento '%s' fallido: %s", nombre, e)
+        tiempos[nombre] = time.perf_counter() - inicio
+    if congelar:
+        gc.freeze()
+    logger.info("Precalentamiento completo: %s", ", ".join(f"{n}={s:.3f}s" for n, s in tiempos.items()))
+    return tiempos